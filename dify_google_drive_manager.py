@@ -6,46 +6,38 @@
 import os
 import re
 import sys
-from datetime import datetime, timezone
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+import sqlite3
+from m01_processed_store import ProcessedStore
+import m01_drive_client
 
 # --- 設定 ---
-SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
-TOKEN_FILE = 'token.json'
 SUCCESS_LOG_FILE = 'dify_get_url_success.log'
 FAILURE_LOG_FILE = 'dify_get_url_failure.log'
 SHARED_DRIVE_FOLDER_ID = '1KarJiVGgwYC8MRoiX14tEBMQifNSxDAe'
 
+_processed_store = None
+
 def _sanitize_filename(filename):
     return re.sub(r'[\\/:*?"<>|]', '_', filename)
 
+def get_processed_store():
+    """成功・失敗ログの索引（ProcessedStore）を返す"""
+    global _processed_store
+    if _processed_store is None:
+        _processed_store = ProcessedStore('dify', [SUCCESS_LOG_FILE, FAILURE_LOG_FILE])
+    return _processed_store
+
 def authenticate():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        print("\nエラー: 認証情報(token.json)が無効です。", file=sys.stderr)
-        print("`python a00_start.py`等を先に実行して、認証を完了させてください。\n", file=sys.stderr)
-        return None
-    if creds.expired and creds.refresh_token:
-        creds.refresh(Request())
-    return build('drive', 'v3', credentials=creds)
+    return m01_drive_client.get_service()
 
 def find_new_files(service):
     if not SHARED_DRIVE_FOLDER_ID:
         print("エラー: 検索対象のフォルダIDが設定されていません！", file=sys.stderr)
         return []
 
-    processed_ids = set()
-    for log_file in [SUCCESS_LOG_FILE, FAILURE_LOG_FILE]:
-        if os.path.exists(log_file):
-            with open(log_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        processed_ids.add(line.strip().split(',')[1])
-    
+    store = get_processed_store()
+    store.import_logs()
+
     print(f"INFO: Driveフォルダ '{SHARED_DRIVE_FOLDER_ID}' をスキャンしています...")
     new_files = []
     page_token = None
@@ -62,7 +54,7 @@ def find_new_files(service):
             includeItemsFromAllDrives=True
         ).execute()
         for file in response.get('files', []):
-            if file.get('id') not in processed_ids:
+            if not store.is_processed(file.get('id')):
                 new_files.append(file)
         page_token = response.get('nextPageToken', None)
         if page_token is None:
@@ -72,11 +64,9 @@ def find_new_files(service):
 def log_entry(log_file, file_id, file_name, status):
     """ログファイルにエントリを追記する (この関数はコントローラーから呼ばれる)"""
     try:
-        with open(log_file, 'a', encoding='utf-8') as f:
-            timestamp = datetime.now(timezone.utc).isoformat()
-            f.write(f"{timestamp},{file_id},{_sanitize_filename(file_name)},{status}\n")
+        get_processed_store().record(log_file, file_id, _sanitize_filename(file_name), status)
         print(f"INFO: ログを記録しました: {log_file} ({_sanitize_filename(file_name)})", file=sys.stderr)
-    except IOError as e:
+    except (IOError, sqlite3.Error) as e:
         print(f"エラー: ログの書き込み中にエラーが発生しました: {e}", file=sys.stderr)
 
 # ▼▼▼ 変更点 ▼▼▼
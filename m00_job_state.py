@@ -0,0 +1,134 @@
+#
+# ファイル名: m00_job_state.py
+# 役割: ジョブ（1つの動画の処理）の進み具合を作業ディレクトリに記録し、途中で失敗した処理を続きから再開できるようにする
+#
+# 処理の段階（STAGES）と、分割ファイルごとの文字起こしの完了を、終わるたびに jobs/<動画ID>/job_state.json に書き込む。
+# 一時ファイルに書いてから置き換えるため、書き込み中に強制終了しても壊れた状態ファイルは残らない。
+# m00_main_mojiokosi.py を --resume で実行すると、完了していないジョブの最初の未完了の段階（分割ファイル）から続ける。
+#
+
+import os
+import json
+import threading
+from datetime import datetime, timezone, timedelta
+
+PYTHON_NAME = os.path.basename(__file__)
+
+# 作業ディレクトリの中に作る状態ファイル
+STATE_FILE = 'job_state.json'
+# 処理の段階（この順に進む）
+#   download   : 動画のダウンロード（ストリーミングで変換した場合は記録しない）
+#   convert    : 音声変換・分割（分割ファイルの一覧を segments に記録する）
+#   transcribe : 全ての分割ファイルの文字起こしと結合（z1_combined.txt）
+#   edit       : 日本語編集（z2_combined.txt）
+#   magazine   : マガジン化（z3_combined.md）
+#   done       : 処理結果の保存と成功ログの記録
+STAGES = ('download', 'convert', 'transcribe', 'edit', 'magazine', 'done')
+
+
+def _timestamp():
+    jst = timezone(timedelta(hours=9))
+    return datetime.now(jst).isoformat()
+
+
+class JobState:
+    """
+    job_state.json の内容。
+    音声変換のスレッドと文字起こしのイベントループの両方から更新されるため、書き込みはロックで排他する。
+    """
+
+    def __init__(self, root):
+        self.path = os.path.join(root, STATE_FILE)
+        self._lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (IOError, json.JSONDecodeError):
+            data = {}
+        data.setdefault('video', {})
+        data.setdefault('stages', {})
+        data.setdefault('segments', {})
+        return data
+
+    def _save_locked(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        # 書き終えてから置き換えることで、読み込む側には前回か今回のどちらかの内容が必ず残る
+        os.replace(tmp_path, self.path)
+
+    @property
+    def video(self):
+        """動画ID（id）・ファイル名（file_name）・内容の md5（content_key）"""
+        return self.data['video']
+
+    def set_video(self, video_id, file_name, content_key=None):
+        """処理する動画を記録する。--resume で再開するときに、再ダウンロードと処理結果の保存に使う"""
+        with self._lock:
+            self.data['video'] = {'id': video_id, 'file_name': file_name, 'content_key': content_key}
+            self._save_locked()
+
+    def is_done(self, stage):
+        return stage in self.data['stages']
+
+    def done_stages(self):
+        return [stage for stage in STAGES if self.is_done(stage)]
+
+    def first_incomplete(self):
+        """最初の未完了の段階を返す。全て完了している場合は None を返す"""
+        for stage in STAGES:
+            if not self.is_done(stage):
+                return stage
+        return None
+
+    def mark_stage(self, stage):
+        """stage の完了を記録する"""
+        with self._lock:
+            self.data['stages'][stage] = _timestamp()
+            self._save_locked()
+
+    def reset(self, stage):
+        """stage とそれより後の段階を未完了に戻す。音声変換からやり直す場合は、分割ファイルの記録も消す"""
+        with self._lock:
+            for later in STAGES[STAGES.index(stage):]:
+                self.data['stages'].pop(later, None)
+            if STAGES.index(stage) <= STAGES.index('convert'):
+                self.data['segments'] = {}
+            self._save_locked()
+
+    def add_segment(self, path):
+        """音声変換が書き終えた分割ファイルを、文字起こし前として記録する"""
+        with self._lock:
+            self.data['segments'].setdefault(os.path.basename(path), False)
+            self._save_locked()
+
+    def mark_segment(self, path):
+        """分割ファイルの文字起こし結果の保存を記録する"""
+        with self._lock:
+            self.data['segments'][os.path.basename(path)] = True
+            self._save_locked()
+
+    def pending_segments(self, split_m4a_dir):
+        """文字起こしが完了していない分割ファイルのパスを、ファイル名順に返す"""
+        return [
+            os.path.join(split_m4a_dir, name)
+            for name, done in sorted(self.data['segments'].items()) if not done
+        ]
+
+
+def list_resumable(jobs_dir):
+    """状態ファイルが有り、完了していないジョブの ID（作業ディレクトリ名）を返す"""
+    if not os.path.isdir(jobs_dir):
+        return []
+    job_ids = []
+    for name in sorted(os.listdir(jobs_dir)):
+        root = os.path.join(jobs_dir, name)
+        if os.path.isdir(root) and os.path.exists(os.path.join(root, STATE_FILE)):
+            if not JobState(root).is_done('done'):
+                job_ids.append(name)
+    return job_ids
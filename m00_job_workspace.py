@@ -0,0 +1,167 @@
+#
+# ファイル名: m00_job_workspace.py
+# 役割: 動画ごとの作業ディレクトリ（ジョブワークスペース）を作成・保持・削除する
+#
+# 各ジョブは jobs/<動画ID>/ の下に downloads・m4a・split_m4a・temp_logs を持つ。
+# 同じマシンで複数の動画（複数のプロセス）を同時に処理しても、お互いの中間ファイルを消さない。
+#
+
+import os
+import re
+import time
+import shutil
+import threading
+import m00_job_state
+
+PYTHON_NAME = os.path.basename(__file__)
+
+# ジョブの作業ディレクトリを作る場所
+JOBS_DIR = 'jobs'
+# 処理が終わったジョブの作業ディレクトリの扱い
+#   'all'     : 全て残す
+#   'outputs' : 成功したジョブは文字起こし結果（split_m4a 内の .txt / .md / .json）だけを残し、
+#               動画と音声を削除する。失敗したジョブは調査できるよう全て残す
+#   'none'    : 成功したジョブは全て削除する（失敗したジョブは残す）
+WORKSPACE_RETENTION = 'outputs'
+# 残したジョブの作業ディレクトリのうち、この日数より前に更新されたものは次回の実行時に削除する（0 で削除しない）
+WORKSPACE_MAX_AGE_DAYS = 7
+# 成功したジョブで残すファイルの拡張子（WORKSPACE_RETENTION が 'outputs' の場合）
+OUTPUT_EXTENSIONS = ('.txt', '.md', '.json')
+# 処理中のジョブを示すロックファイル（作業ディレクトリと同じ階層に作る）
+LOCK_SUFFIX = '.lock'
+
+_workspaces = {}
+_workspaces_lock = threading.Lock()
+
+
+def _pid_alive(pid):
+    """プロセスが実行中であれば True を返す"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # 他のユーザーのプロセスとして存在している
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class JobWorkspace:
+    """
+    1つの動画を処理するための作業ディレクトリ。
+    各モジュールには、ここで決めたパス（downloads_dir・m4a_dir・split_m4a_dir・temp_log_dir）を引数で渡す。
+    """
+
+    def __init__(self, job_id, jobs_dir=JOBS_DIR):
+        self.job_id = re.sub(r'[^A-Za-z0-9_.-]', '_', job_id)
+        self.root = os.path.join(jobs_dir, self.job_id)
+        self.downloads_dir = os.path.join(self.root, 'downloads')
+        self.m4a_dir = os.path.join(self.root, 'm4a')
+        self.split_m4a_dir = os.path.join(self.root, 'split_m4a')
+        self.temp_log_dir = os.path.join(self.root, 'temp_logs')
+        self.lock_path = self.root + LOCK_SUFFIX
+        self.state = None
+
+    def create(self, reset=True):
+        """
+        ロックを取得し、前回の残りを削除して作業ディレクトリを作り直す。
+        reset が False の場合は、前回の残りと処理の進み具合（job_state.json）を引き継ぐ。
+        同じ動画を別のプロセスが処理中の場合は RuntimeError を送出する。
+        """
+        os.makedirs(os.path.dirname(self.root) or '.', exist_ok=True)
+        self._acquire_lock()
+        if reset and os.path.exists(self.root):
+            shutil.rmtree(self.root)
+        for d in (self.downloads_dir, self.m4a_dir, self.split_m4a_dir, self.temp_log_dir):
+            os.makedirs(d, exist_ok=True)
+        self.state = m00_job_state.JobState(self.root)
+        if reset:
+            print(f"作業ディレクトリを作成しました: {self.root} : ({PYTHON_NAME})")
+        else:
+            print(f"作業ディレクトリを引き継ぎました: {self.root} : ({PYTHON_NAME})")
+        return self
+
+    def _lock_owner(self):
+        """ロックを持っているプロセスの PID を返す。ロックが無い場合は 0 を返す"""
+        try:
+            with open(self.lock_path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (IOError, ValueError):
+            return 0
+
+    def is_locked(self):
+        """他の実行中のプロセスがこのジョブを処理中であれば True を返す"""
+        pid = self._lock_owner()
+        return bool(pid) and pid != os.getpid() and _pid_alive(pid)
+
+    def _acquire_lock(self):
+        try:
+            fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if self.is_locked():
+                raise RuntimeError(f"別のプロセス（PID {self._lock_owner()}）が同じ動画を処理中です: {self.root}")
+            # 異常終了したプロセスのロックは引き継ぐ
+            fd = os.open(self.lock_path, os.O_CREAT | os.O_TRUNC | os.O_WRONLY)
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+
+    def release(self, succeeded, retention=None):
+        """WORKSPACE_RETENTION に従って作業ディレクトリを整理し、ロックを解放する"""
+        retention = retention or WORKSPACE_RETENTION
+        if succeeded and retention == 'none':
+            shutil.rmtree(self.root, ignore_errors=True)
+            print(f"作業ディレクトリを削除しました: {self.root} : ({PYTHON_NAME})")
+        elif succeeded and retention == 'outputs':
+            for d in (self.downloads_dir, self.m4a_dir):
+                shutil.rmtree(d, ignore_errors=True)
+            if os.path.isdir(self.split_m4a_dir):
+                for name in os.listdir(self.split_m4a_dir):
+                    if not name.endswith(OUTPUT_EXTENSIONS):
+                        os.remove(os.path.join(self.split_m4a_dir, name))
+        try:
+            os.remove(self.lock_path)
+        except FileNotFoundError:
+            pass
+
+
+def open_workspace(job_id, jobs_dir=JOBS_DIR, resume=False):
+    """
+    job_id の作業ディレクトリを返す。このプロセスで初めて開く場合は作り直す（resume が True の場合は引き継ぐ）。
+    バッチモードではダウンロード用のスレッドと文字起こしの処理の両方から呼ばれるため、
+    同じ job_id には同じ JobWorkspace を返す。
+    """
+    with _workspaces_lock:
+        workspace = JobWorkspace(job_id, jobs_dir)
+        if workspace.root not in _workspaces:
+            _workspaces[workspace.root] = workspace.create(reset=not resume)
+        return _workspaces[workspace.root]
+
+
+def close_workspace(workspace, succeeded):
+    """ジョブの終了時に呼び、作業ディレクトリを整理する"""
+    with _workspaces_lock:
+        _workspaces.pop(workspace.root, None)
+    workspace.release(succeeded)
+
+
+def prune_workspaces(jobs_dir=JOBS_DIR, max_age_days=None):
+    """処理中でない作業ディレクトリのうち、max_age_days 日より前に更新されたものを削除する"""
+    max_age_days = WORKSPACE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    if not max_age_days or not os.path.isdir(jobs_dir):
+        return 0
+    deadline = time.time() - max_age_days * 24 * 60 * 60
+    removed = 0
+    for name in os.listdir(jobs_dir):
+        workspace = JobWorkspace(name, jobs_dir)
+        if not os.path.isdir(workspace.root) or workspace.is_locked():
+            continue
+        if os.path.getmtime(workspace.root) < deadline:
+            shutil.rmtree(workspace.root, ignore_errors=True)
+            if os.path.exists(workspace.lock_path):
+                os.remove(workspace.lock_path)
+            removed += 1
+    if removed:
+        print(f"{max_age_days}日より前の作業ディレクトリを{removed}件削除しました。 : ({PYTHON_NAME})")
+    return removed
@@ -1,91 +1,454 @@
 import asyncio
 import os
-import shutil
 import argparse
 
 # 他のモジュールのインポート
+import m00_job_state
+import m00_job_workspace
 import m01_google_drive_manager
 import m02_ffmpeg
+import m02_silence_trim
+import m03_gemini_client
+import m03_gemini_stream
 import m03_gemini_transcript1
 import m03_gemini_transcript2
+import m03_transcript_cache
+import m04_result_store
 
 PYTHON_NAME = os.path.basename(__file__)
 
-def setup_directories():
-    """処理に必要なディレクトリをクリーンアップして再作成する"""
-    # 一時ログ用のディレクトリも作成
-    dirs_to_create = ["m4a", "split_m4a", "downloads", "temp_logs"]
-    for d in dirs_to_create:
-        if os.path.exists(d):
-            shutil.rmtree(d)
-            print(f"ディレクトリ '{d}' を削除しました。")
-        os.makedirs(d)
-        print(f"ディレクトリ '{d}' を作成しました。")
-
-async def main():
-    """指定された1つの動画をダウンロードし、文字起こし処理を実行する"""
-    
-    temp_log_dir = "temp_logs"
-    os.makedirs(temp_log_dir, exist_ok=True)
+def result_finder(content_keys):
+    """
+    m01_google_drive_manager に渡す find_result を返す。
+    各動画の md5Checksum を content_keys（動画ID -> md5）に記録し、同じ内容の処理結果が保存済みなら True を返す。
+    """
+    def find_result(video):
+        content_keys[video['id']] = video.get('md5Checksum')
+        return m04_result_store.lookup(video.get('md5Checksum')) is not None
+    return find_result
+
+def resolve_content_key(content_key, local_path):
+    """Drive の md5Checksum が無い場合は、ダウンロード済みの動画から md5 を計算する"""
+    if not content_key and local_path and os.path.exists(local_path):
+        content_key = m04_result_store.file_md5(local_path)
+    return content_key
+
+def downloads_dir_for(video):
+    """m01_google_drive_manager に渡す downloads_dir_for。動画ごとの作業ディレクトリにダウンロードさせる"""
+    return m00_job_workspace.open_workspace(video['id']).downloads_dir
+
+async def convert_and_transcribe(workspace, input_file):
+    """
+    m02_ffmpeg で音声変換・分割を行いながら、ffmpeg が書き終えた分割ファイルから順に文字起こしする。
+    全体の所要時間は、音声変換と文字起こしの合計ではなく、ほぼ長い方の時間になる。
+    分割ファイルと文字起こしの完了は workspace.state に記録する。
+    結合したテキストのパスを返す。
+    """
+    state = workspace.state
+    loop = asyncio.get_running_loop()
+    # 分割ファイルがアップロードを待った時間を集計できるよう、m03_gemini_transcript1 のキューを使う
+    queue = m03_gemini_transcript1.MeasuredQueue()
+    trim_results = {}
+
+    def on_segment(path):
+        # ffmpeg の終了を待つスレッドから呼ばれる
+        if m02_silence_trim.TRIM_SILENCE:
+            trim_results[path] = m02_silence_trim.trim_segment(path)
+        # 文字起こし前の分割ファイルとして記録してから、文字起こしに渡す
+        state.add_segment(path)
+        loop.call_soon_threadsafe(queue.put_nowait, path)
+
+    def convert():
+        try:
+            m02_ffmpeg.main(input_file, downloads_dir=workspace.downloads_dir, m4a_dir=workspace.m4a_dir,
+                            split_m4a_dir=workspace.split_m4a_dir, on_segment=on_segment)
+        except SystemExit as e:
+            # m02_ffmpeg は失敗時に sys.exit するため、呼び出し元で扱えるよう例外に変換する
+            raise RuntimeError(f"音声変換に失敗しました (exit code: {e.code})")
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    transcription = asyncio.create_task(
+        m03_gemini_transcript1.main_queue(queue, workspace.split_m4a_dir, state.mark_segment)
+    )
+    try:
+        await asyncio.to_thread(convert)
+    except Exception:
+        transcription.cancel()
+        raise
+    state.mark_stage('convert')
+    if trim_results:
+        m02_silence_trim.write_trim_map(workspace.split_m4a_dir, trim_results)
+    return await transcription
+
+async def transcribe_segments(workspace):
+    """音声変換が済んだ作業ディレクトリで、文字起こしが完了していない分割ファイルだけを文字起こしし、結合したテキストのパスを返す"""
+    state = workspace.state
+    pending = state.pending_segments(workspace.split_m4a_dir)
+    if not pending:
+        return m03_gemini_transcript1.combine_transcripts(workspace.split_m4a_dir)
+    print(f"{len(pending)}件の分割ファイルを文字起こしします（完了済み: {len(state.data['segments']) - len(pending)}件）")
+    queue = m03_gemini_transcript1.MeasuredQueue()
+    for path in pending:
+        queue.put_nowait(path)
+    queue.put_nowait(None)
+    return await m03_gemini_transcript1.main_queue(queue, workspace.split_m4a_dir, state.mark_segment)
+
+def finish_streamed_conversion(workspace):
+    """ストリーミングで変換した分割ファイルの長い無音を短縮し（任意）、音声変換の完了を workspace.state に記録する"""
+    if m02_silence_trim.TRIM_SILENCE:
+        print("\n--- 無音の短縮を開始します ---")
+        m02_silence_trim.main(workspace.split_m4a_dir)
+    for extract in m03_gemini_transcript1.AUDIO_EXTRACTS:
+        for path in m03_gemini_transcript1.get_m4a_file_names(workspace.split_m4a_dir, extract):
+            workspace.state.add_segment(path)
+    workspace.state.mark_stage('convert')
+
+async def transcribe_downloaded_video(workspace, input_file=None):
+    """
+    ダウンロード済みの動画に対して、音声変換・文字起こし・編集とマガジン化を実行する。
+    中間ファイルと結果は、全て workspace（ジョブの作業ディレクトリ）の中に作る。
+    workspace.state（m00_job_state.JobState）に完了を記録した段階と分割ファイルは実行せず、最初の未完了のものから続ける。
+    途中で失敗した場合は RuntimeError を送出する（--resume で続きから再開できる）。
+    """
+    state = workspace.state
+    if not state.is_done('convert'):
+        # 音声変換の途中で止まった場合は、音声変換からやり直す
+        # （文字起こし済みの分割ファイルは、m03_transcript_cache のキャッシュから再利用される）
+        state.reset('convert')
+        # 3. ffmpegで音声変換・分割し、4. 分割ファイルが出来たものから Gemini で文字起こしする
+        print("\n--- 音声変換と文字起こしを開始します ---")
+        combined_file_path = await convert_and_transcribe(workspace, input_file)
+    elif not state.is_done('transcribe'):
+        # 4. Geminiで文字起こし（完了していない分割ファイルのみ）
+        print("\n--- 文字起こしを開始します ---")
+        combined_file_path = await transcribe_segments(workspace)
+    else:
+        combined_file_path = os.path.join(workspace.split_m4a_dir, "z1_combined.txt")
+
+    if not state.is_done('transcribe'):
+        pending = state.pending_segments(workspace.split_m4a_dir)
+        if pending:
+            raise RuntimeError(f"{len(pending)}件の分割ファイルの文字起こしに失敗しました（--resume で続きから再開できます）")
+        # 結合ファイルが正常に作成されたかチェック
+        if not combined_file_path or not os.path.exists(combined_file_path):
+            raise RuntimeError("結合された文字起こしファイルが見つかりません。")
+        state.mark_stage('transcribe')
+
+    print("\n--- 編集とマガジン化を開始します ---")
+    # 結合ファイルのパスを m03_gemini_transcript2.main() の引数として渡す。完了済みのステップは実行しない
+    if not await m03_gemini_transcript2.main(combined_file_path, state.done_stages(), state.mark_stage):
+        raise RuntimeError("編集とマガジン化に失敗しました（--resume で続きから再開できます）")
+
+def record_success(workspace, real_video_id, video_filename):
+    """成功ログを記録し、ジョブの完了を workspace.state に記録する"""
+    success_log_path = os.path.join(workspace.temp_log_dir, "success.log")
+    m01_google_drive_manager.log_success(real_video_id, video_filename, success_log_path)
+    workspace.state.mark_stage('done')
+
+async def main_batch(max_videos, max_workers):
+    """
+    未処理の動画を最大 max_videos 件（0 で全件）並列ダウンロードし、
+    ダウンロードが完了した動画から順に文字起こし処理を実行する。
+    """
+    m00_job_workspace.prune_workspaces()
+
+    content_keys = {}
+    downloads = m01_google_drive_manager.iter_downloaded_videos(
+        max_videos, max_workers, result_finder(content_keys), downloads_dir_for
+    )
+    processed_count = 0
+    failed_count = 0
+    while True:
+        # ダウンロード待ちでイベントループを止めないよう、別スレッドで次の完了を待つ
+        result = await asyncio.to_thread(next, downloads, None)
+        if result is None:
+            break
+        real_video_id, video_filename, local_path, ok = result
+
+        if not ok:
+            # ダウンロード失敗は失敗ログに残さず、次回の実行で再取得させる
+            print(f"ダウンロードに失敗したため、この動画をスキップします: {video_filename}")
+            m00_job_workspace.close_workspace(m00_job_workspace.open_workspace(real_video_id), succeeded=False)
+            failed_count += 1
+            continue
+
+        print(f"\n--- 処理開始: {video_filename} ---")
+        # 処理結果を再利用する動画は、ここで初めて作業ディレクトリを作る
+        workspace = m00_job_workspace.open_workspace(real_video_id)
+        succeeded = False
+        try:
+            content_key = resolve_content_key(content_keys.get(real_video_id), local_path)
+            # 失敗した場合に --resume で再開できるよう、処理する動画を作業ディレクトリに記録する
+            workspace.state.set_video(real_video_id, video_filename, content_key)
+            # 同じ内容の動画を処理済みであれば、Gemini などを呼ばずに結果を再利用する
+            if not m04_result_store.restore(content_key, workspace.split_m4a_dir):
+                workspace.state.mark_stage('download')
+                try:
+                    await transcribe_downloaded_video(workspace, local_path)
+                except SystemExit as e:
+                    # m02_ffmpeg は失敗時に sys.exit するため、次の動画に進めるよう例外に変換する
+                    raise RuntimeError(f"音声変換に失敗しました (exit code: {e.code})")
+                m04_result_store.save(content_key, workspace.split_m4a_dir, real_video_id, video_filename)
+
+            record_success(workspace, real_video_id, video_filename)
+            processed_count += 1
+            succeeded = True
+            print(f"\n--- 処理が正常に完了しました: {video_filename} ---")
+        except Exception as e:
+            print(f"エラーが発生したため、この動画の処理を中断します: {video_filename}")
+            print(f"エラー詳細: {e}")
+            failure_log_path = os.path.join(workspace.temp_log_dir, "failure.log")
+            m01_google_drive_manager.log_failure(real_video_id, video_filename, str(e), failure_log_path)
+            failed_count += 1
+        finally:
+            # WORKSPACE_RETENTION に従い、処理済みの動画や音声を削除してディスクを空ける
+            m00_job_workspace.close_workspace(workspace, succeeded)
+
+    # 動画をまたいで使い回した Gemini クライアントの接続を閉じる
+    await m03_gemini_client.close_clients()
+    print(f"\n--- バッチ処理完了: 成功 {processed_count}件 / 失敗 {failed_count}件 ---")
+
+async def main(stream=False):
+    """
+    指定された1つの動画をダウンロードし、文字起こし処理を実行する。
+    stream が True の場合は、動画を保存せずに受信しながら ffmpeg で音声に変換する。
+    """
 
     print(f"--- 処理開始: ")
     real_video_id = None
     video_filename = None
+    workspace = None
+    succeeded = False
+    # m01_google_drive_manager.main が作業ディレクトリを作らせた場合に、そのディレクトリを記録する
+    opened_workspaces = []
+    opened_video_ids = []
 
     try:
-        # 1. ディレクトリのセットアップ
-        setup_directories()
+        # 1. 以前の実行で残した古い作業ディレクトリを削除する
+        m00_job_workspace.prune_workspaces()
 
         # 2. Google Driveから指定された動画をダウンロード
         print("Google Driveに接続しています...")
-        real_video_id, video_filename = m01_google_drive_manager.main()
+        streamed = []
+        def open_downloads_dir(video):
+            # ストリーミング変換の出力先と、失敗時のログの記録先にも使うため、作成した作業ディレクトリを覚えておく
+            opened_workspaces.append(m00_job_workspace.open_workspace(video['id']))
+            opened_video_ids.append(video['id'])
+            return opened_workspaces[-1].downloads_dir
+        def convert_stream(write_to, file_name):
+            # ストリーミング変換が失敗しても --resume で動画をダウンロードして再開できるよう、先に動画を記録する
+            opened_workspaces[-1].state.set_video(
+                opened_video_ids[-1], file_name, content_keys.get(opened_video_ids[-1])
+            )
+            print("\n--- ダウンロードしながら音声変換を開始します ---")
+            ok = m02_ffmpeg.main_stream(write_to, file_name, opened_workspaces[-1].split_m4a_dir)
+            streamed.append(ok)
+            return ok
+
+        content_keys = {}
+        real_video_id, video_filename = m01_google_drive_manager.main(
+            convert_stream if stream else None, result_finder(content_keys), open_downloads_dir
+        )
         
         if not video_filename:
             print(f"ダウンロード対象が有りません。処理を正常終了します。")
             return
 
-        # 3. ffmpegで音声変換・分割
-        print("\n--- 音声変換を開始します ---")
-        m02_ffmpeg.main()
-
-        # 4. Geminiで文字起こし・編集・要約
-        print("\n--- 文字起こしを開始します ---")
-        # --- ▼▼▼ ここからが修正箇所 ▼▼▼ ---
-        
-        # m03_gemini_transcript1.main() の戻り値（結合ファイルのパス）を変数に格納する
-        combined_file_path = await m03_gemini_transcript1.main()
-        
-        # 結合ファイルが正常に作成されたかチェック
-        if combined_file_path and os.path.exists(combined_file_path):
-            print("\n--- 編集とマガジン化を開始します ---")
-            # 格納したパスを、m03_gemini_transcript2.main() の引数として渡す
-            await m03_gemini_transcript2.main(combined_file_path)
-        else:
-            # 結合ファイルが作成されなかった場合は、後続処理をスキップする
-            print("警告: 結合された文字起こしファイルが見つからなかったため、編集とマガジン化の処理をスキップします。")
-
-        # --- ▲▲▲ ここまでが修正箇所 ▲▲▲ ---
+        workspace = m00_job_workspace.open_workspace(real_video_id)
+        local_path = m01_google_drive_manager.local_video_path(video_filename, workspace.downloads_dir)
+        content_key = resolve_content_key(content_keys.get(real_video_id), local_path)
+        # 失敗した場合に --resume で再開できるよう、処理する動画を作業ディレクトリに記録する
+        workspace.state.set_video(real_video_id, video_filename, content_key)
+        # 同じ内容の動画を処理済みであれば、Gemini などを呼ばずに結果を再利用する
+        if not m04_result_store.restore(content_key, workspace.split_m4a_dir):
+            if streamed:
+                # ストリーミングで音声変換・分割が済んでいるため、文字起こしから始める
+                finish_streamed_conversion(workspace)
+            else:
+                workspace.state.mark_stage('download')
+            await transcribe_downloaded_video(workspace, local_path)
+            m04_result_store.save(content_key, workspace.split_m4a_dir, real_video_id, video_filename)
 
         # 5. 成功ログを一時ファイルに記録
-        success_log_path = os.path.join(temp_log_dir, f"success_0.log")
-        m01_google_drive_manager.log_success(real_video_id, video_filename, success_log_path)
+        record_success(workspace, real_video_id, video_filename)
+        succeeded = True
 
         print(f"\n--- 全ての処理が正常に完了しました: {video_filename} ---")
+        print(f"結果の保存先: {workspace.split_m4a_dir}")
 
     except Exception as e:
         print(f"エラーが発生したため、処理を中断します: {video_filename}")
         print(f"エラー詳細: {e}")
-        # 失敗ログを一時ファイルに記録
-        failure_log_path = os.path.join(temp_log_dir, f"failure_0.log")
+        # 失敗ログを一時ファイルに記録（作業ディレクトリを作る前の失敗は temp_logs に記録する）
+        if workspace is None and opened_workspaces:
+            workspace = opened_workspaces[-1]
+        temp_log_dir = workspace.temp_log_dir if workspace else "temp_logs"
+        os.makedirs(temp_log_dir, exist_ok=True)
+        failure_log_path = os.path.join(temp_log_dir, "failure.log")
         log_filename = video_filename if video_filename else "UnknownFileOnError"
         log_video_id = real_video_id if real_video_id else "UnknownIDOnError"
         m01_google_drive_manager.log_failure(log_video_id, log_filename, str(e), failure_log_path)
         raise
+    finally:
+        if workspace is not None:
+            m00_job_workspace.close_workspace(workspace, succeeded)
+        await m03_gemini_client.close_clients()
+
+def download_for_resume(workspace):
+    """--resume で音声変換からやり直すジョブの動画を返す。作業ディレクトリに無い場合はダウンロードし直す"""
+    video = workspace.state.video
+    local_path = m01_google_drive_manager.local_video_path(video['file_name'], workspace.downloads_dir)
+    if workspace.state.is_done('download') and os.path.exists(local_path):
+        return local_path
+    service = m01_google_drive_manager.authenticate()
+    if not service or not m01_google_drive_manager.download_video(
+            service, video['id'], video['file_name'], downloads_dir=workspace.downloads_dir):
+        raise RuntimeError(f"動画のダウンロードに失敗しました: {video['file_name']}（次回の実行で続きから再開します）")
+    workspace.state.mark_stage('download')
+    return local_path
+
+async def main_resume():
+    """
+    前回までの実行で完了しなかったジョブ（jobs/<動画ID>/job_state.json が有り、完了していないもの）を、
+    それぞれ最初の未完了の段階から再開する。失敗ログに記録された動画も対象にする。
+    """
+    job_ids = m00_job_state.list_resumable(m00_job_workspace.JOBS_DIR)
+    if not job_ids:
+        print("再開するジョブは有りません。")
+        return
+
+    processed_count = 0
+    failed_count = 0
+    for job_id in job_ids:
+        try:
+            workspace = m00_job_workspace.open_workspace(job_id, resume=True)
+        except RuntimeError as e:
+            # 別のプロセスが処理中のジョブは再開しない
+            print(f"このジョブをスキップします: {e}")
+            continue
+        video = workspace.state.video
+        real_video_id = video.get('id')
+        video_filename = video.get('file_name')
+        succeeded = False
+        try:
+            if not real_video_id:
+                raise RuntimeError(f"処理する動画が記録されていません: {workspace.root}")
+            print(f"\n--- 処理再開: {video_filename}（{workspace.state.first_incomplete()} から） ---")
+            if not workspace.state.is_done('magazine'):
+                input_file = None if workspace.state.is_done('convert') else download_for_resume(workspace)
+                try:
+                    await transcribe_downloaded_video(workspace, input_file)
+                except SystemExit as e:
+                    # m02_ffmpeg は失敗時に sys.exit するため、次のジョブに進めるよう例外に変換する
+                    raise RuntimeError(f"音声変換に失敗しました (exit code: {e.code})")
+            m04_result_store.save(video.get('content_key'), workspace.split_m4a_dir, real_video_id, video_filename)
+
+            record_success(workspace, real_video_id, video_filename)
+            processed_count += 1
+            succeeded = True
+            print(f"\n--- 処理が正常に完了しました: {video_filename} ---")
+        except Exception as e:
+            print(f"エラーが発生したため、このジョブの処理を中断します: {video_filename}")
+            print(f"エラー詳細: {e}")
+            failure_log_path = os.path.join(workspace.temp_log_dir, "failure.log")
+            m01_google_drive_manager.log_failure(
+                real_video_id or job_id, video_filename or "UnknownFileOnError", str(e), failure_log_path
+            )
+            failed_count += 1
+        finally:
+            m00_job_workspace.close_workspace(workspace, succeeded)
+
+    await m03_gemini_client.close_clients()
+    print(f"\n--- 再開した処理が完了: 成功 {processed_count}件 / 失敗 {failed_count}件 ---")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Google Driveの動画を文字起こしする")
+    parser.add_argument(
+        "--batch", type=int, default=None, metavar="N",
+        help="未処理の動画を最大N件まとめて処理する（0で全件）。省略時は1件のみ処理する。"
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="前回までに途中で失敗したジョブ（jobs/<動画ID>）を、完了していない段階・分割ファイルから再開する"
+    )
+    parser.add_argument(
+        "--download-workers", type=int, default=m01_google_drive_manager.MAX_CONCURRENT_DOWNLOADS,
+        help="バッチモードで同時に実行するダウンロード数"
+    )
+    parser.add_argument(
+        "--download-connections", type=int, default=m01_google_drive_manager.DOWNLOAD_CONNECTIONS,
+        help="1つの動画を何本の接続で並列にダウンロードするか（1で先頭から順に取得する）"
+    )
+    parser.add_argument(
+        "--extract-workers", type=int, default=m02_ffmpeg.EXTRACT_WORKERS,
+        help="音声の変換を分割ファイルごとに並列実行する数（1で1つのffmpegが先頭から順に変換する）"
+    )
+    parser.add_argument(
+        "--audio-profile", choices=list(m02_ffmpeg.AUDIO_PROFILES), default=m02_ffmpeg.AUDIO_PROFILE,
+        help="音声のエンコード設定（z04_audio_profile_benchmark.py でサイズと精度を比較できる）"
+    )
+    parser.add_argument(
+        "--keep-full-m4a", action="store_true", default=m02_ffmpeg.KEEP_FULL_M4A,
+        help="分割前の音声全体も作業ディレクトリの m4a フォルダに出力する（音声の変換は並列化しない）"
+    )
+    parser.add_argument(
+        "--trim-silence", action="store_true", default=m02_silence_trim.TRIM_SILENCE,
+        help="文字起こしの前に、分割した音声の長い無音を短縮する"
+    )
+    parser.add_argument(
+        "--keep-workspace", choices=("all", "outputs", "none"), default=m00_job_workspace.WORKSPACE_RETENTION,
+        help="処理が成功した動画の作業ディレクトリ（jobs/<動画ID>）に残すもの（失敗した動画は全て残す）"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=m03_gemini_transcript1.MAX_CONCURRENT_REQUESTS,
+        help="文字起こしで Gemini に同時に送るリクエスト数の初期値"
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, default=m03_gemini_transcript1.MAX_CONCURRENT_REQUESTS_LIMIT,
+        help="応答の状況を見て同時リクエスト数を増やす上限（--concurrency と同じ値で固定）"
+    )
+    parser.add_argument(
+        "--upload-workers", type=int, default=m03_gemini_transcript1.MAX_CONCURRENT_UPLOADS,
+        help="文字起こしの前に、音声を Gemini に同時にアップロードする数（文字起こしの並列数とは別）"
+    )
+    parser.add_argument(
+        "--inline-audio-max-mb", type=float, default=m03_gemini_transcript1.INLINE_AUDIO_MAX_BYTES / (1024 * 1024),
+        help="このサイズ（MB）以下の分割ファイルはアップロードせず、リクエストに埋め込んで送る（0で常にアップロードする）"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Gemini の応答のキャッシュ（.transcript_cache）を使わず、全ての分割ファイルと編集を Gemini に送り直す"
+    )
+    parser.add_argument(
+        "--no-stream-generation", action="store_true",
+        help="Gemini の応答をストリーミングで受け取らず、応答全体を1回で受け取る"
+    )
+    parser.add_argument(
+        "--stream", action="store_true",
+        help="動画をdownloadsに保存せず、受信しながらffmpegで音声に変換する（1件のみ処理する場合）"
+    )
+    args = parser.parse_args()
+    m01_google_drive_manager.DOWNLOAD_CONNECTIONS = args.download_connections
+    m02_ffmpeg.EXTRACT_WORKERS = args.extract_workers
+    m02_ffmpeg.set_audio_profile(args.audio_profile)
+    m02_ffmpeg.KEEP_FULL_M4A = args.keep_full_m4a
+    m02_silence_trim.TRIM_SILENCE = args.trim_silence
+    m00_job_workspace.WORKSPACE_RETENTION = args.keep_workspace
+    m03_gemini_transcript1.MAX_CONCURRENT_REQUESTS = args.concurrency
+    m03_gemini_transcript1.MAX_CONCURRENT_REQUESTS_LIMIT = args.max_concurrency
+    m03_gemini_transcript1.MAX_CONCURRENT_UPLOADS = args.upload_workers
+    m03_gemini_transcript1.INLINE_AUDIO_MAX_BYTES = int(args.inline_audio_max_mb * 1024 * 1024)
+    m03_transcript_cache.TRANSCRIPT_CACHE = not args.no_cache
+    m03_gemini_stream.STREAM_GENERATION = not args.no_stream_generation
 
     try:
-        asyncio.run(main())
+        if args.resume:
+            asyncio.run(main_resume())
+        elif args.batch is not None:
+            asyncio.run(main_batch(args.batch, args.download_workers))
+        else:
+            asyncio.run(main(args.stream))
     except Exception as e:
         # main内で捕捉されなかった予期せぬエラー
         print(f"スクリプト全体で致命的なエラーが発生しました: {e}")
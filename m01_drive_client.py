@@ -0,0 +1,117 @@
+#
+# ファイル名: m01_drive_client.py
+# 役割: Google Drive API のサービスオブジェクトを作成・再利用する（文字起こし・Difyの両方から使う）
+#
+
+import os
+import sys
+import json
+import queue
+import threading
+from datetime import datetime, timezone, timedelta
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import build_http
+import google_auth_httplib2
+import requests
+
+# --- 設定 ---
+SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+TOKEN_FILE = 'token.json'
+# Drive API v3 のディスカバリードキュメントのキャッシュ先
+DISCOVERY_CACHE_FILE = '.drive_v3_discovery.json'
+DISCOVERY_URL = 'https://www.googleapis.com/discovery/v1/apis/drive/v3/rest'
+# アクセストークンの有効期限がこの時間以内に迫ったら更新する
+CREDENTIALS_REFRESH_MARGIN = timedelta(minutes=5)
+
+_lock = threading.Lock()
+_credentials = None
+_discovery_document = None
+# 使い終わった認証済み HTTP 接続を保管し、次の利用者に渡す（TLS の接続を使い回すため）
+_http_pool = queue.LifoQueue()
+# httplib2 はスレッドセーフではないため、サービスオブジェクトはスレッドごとに1つ作って使い回す
+_local = threading.local()
+
+
+def _load_discovery_document():
+    """
+    Drive API v3 のディスカバリードキュメントを返す。
+    ライブラリ同梱のものを優先し、無ければ一度だけダウンロードして DISCOVERY_CACHE_FILE に保存する。
+    """
+    if os.path.exists(DISCOVERY_CACHE_FILE):
+        with open(DISCOVERY_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    content = get_static_doc('drive', 'v3')
+    if content is None:
+        print("ディスカバリードキュメントをダウンロードしています...", file=sys.stderr)
+        response = requests.get(DISCOVERY_URL, timeout=60)
+        response.raise_for_status()
+        content = response.text
+    with open(DISCOVERY_CACHE_FILE, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return json.loads(content)
+
+
+def _needs_refresh(creds):
+    """アクセストークンが期限切れ、または CREDENTIALS_REFRESH_MARGIN 以内に期限を迎える場合に True を返す"""
+    if not creds.token:
+        return True
+    if creds.expiry is None:
+        return False
+    # google-auth の expiry はタイムゾーン情報を持たない UTC の日時
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return creds.expiry - now < CREDENTIALS_REFRESH_MARGIN
+
+
+def get_credentials():
+    """
+    token.json の認証情報を返す。読み込みはプロセス内で1回だけ行い、
+    アクセストークンは期限が近づいたときだけ更新する。無効な場合は None を返す。
+    """
+    global _credentials
+    with _lock:
+        if _credentials is None and os.path.exists(TOKEN_FILE):
+            _credentials = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+        creds = _credentials
+        if creds and _needs_refresh(creds) and creds.refresh_token:
+            creds.refresh(Request())
+    if not creds or not creds.valid:
+        print("\nエラー: 認証情報(token.json)が無効です。", file=sys.stderr)
+        print("`python a00_start.py`を先に実行して、認証を完了させてください。\n", file=sys.stderr)
+        return None
+    return creds
+
+
+def acquire_http():
+    """認証済みの HTTP 接続を返す。使い終わったら release_http() で返却する"""
+    try:
+        return _http_pool.get_nowait()
+    except queue.Empty:
+        return google_auth_httplib2.AuthorizedHttp(get_credentials(), http=build_http())
+
+
+def release_http(http):
+    """acquire_http() で取得した接続を返却する。エラーが起きた接続は返却せずに捨てる"""
+    _http_pool.put(http)
+
+
+def get_service():
+    """
+    Drive API v3 のサービスオブジェクトを返す。認証情報が無効な場合は None を返す。
+
+    同じスレッドからの呼び出しには同じサービスオブジェクト（と keep-alive の HTTP 接続）を返すため、
+    一覧取得とダウンロードで接続を使い回せる。
+    """
+    global _discovery_document
+    if not get_credentials():
+        return None
+    service = getattr(_local, 'service', None)
+    if service is None:
+        with _lock:
+            if _discovery_document is None:
+                _discovery_document = _load_discovery_document()
+        service = build_from_document(_discovery_document, http=acquire_http())
+        _local.service = service
+    return service
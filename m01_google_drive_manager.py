@@ -1,41 +1,69 @@
 import os
-import io
 import re
 import sys
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-from google.auth.transport.requests import Request
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+import google_auth_httplib2
+from m01_processed_store import ProcessedStore
+import m01_drive_client
+import m04_result_store
 
 # --- 設定 ---
-SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
-TOKEN_FILE = 'token.json'
 SUCCESS_LOG_FILE = 'processed_success.log'
 FAILURE_LOG_FILE = 'processed_failure.log'
 DOWNLOADS_DIR = 'downloads'
+# ダウンロード途中のファイルと状態ファイルの保存先（実行のたびに削除されないよう DOWNLOADS_DIR とは分ける）
+PARTIAL_DOWNLOADS_DIR = '.partial_downloads'
+# 1回の Range リクエストで取得するバイト数。失敗時はこの単位で再取得する
+DOWNLOAD_CHUNK_SIZE = 32 * 1024 * 1024
+# 1つのチャンクの取得に失敗したときの最大再試行回数
+DOWNLOAD_MAX_RETRIES = 5
+# 1ファイルを何本の HTTP 接続で並列に取得するか（1 で従来どおり先頭から順に取得する）
+DOWNLOAD_CONNECTIONS = 1
+# 並列取得を行う最小ファイルサイズ。これより小さいファイルは接続を増やしても速くならない
+PARALLEL_DOWNLOAD_MIN_SIZE = 2 * DOWNLOAD_CHUNK_SIZE
+# True のとき、前回の実行以降に Drive で変更されたファイルだけを取得する（初回と page token が無効な場合はフルスキャン）
+INCREMENTAL_SCAN = True
+# 動画ファイルについて Drive から取得する項目
+VIDEO_FIELDS = 'id, name, fileExtension, size, md5Checksum, createdTime'
+# 処理対象にする Drive のファイル種別（mimeType の先頭）。音声だけのファイルも文字起こしできる
+MEDIA_MIME_PREFIXES = ('video/', 'audio/')
+# 先頭から順に読むだけでは変換できない可能性がある（moov ボックスが末尾にあり得る）拡張子
+MP4_EXTENSIONS = ('.mp4', '.m4v', '.mov')
+# バッチモードで1回の実行あたりに処理する動画の最大件数（0 または None で全件）
+MAX_VIDEOS_PER_RUN = 0
+# バッチモードで同時に実行するダウンロード（get_media ストリーム）の数
+MAX_CONCURRENT_DOWNLOADS = 2
 
 # ▼▼▼ ここが未完成なポイント！ ▼▼▼
 # TODO: Geminiに指示して、ここにGoogle DriveのフォルダIDを設定してもらう
 SHARED_DRIVE_FOLDER_ID = '1KarJiVGgwYC8MRoiX14tEBMQifNSxDAe'
 # ▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲
 
+_processed_store = None
+_processed_store_lock = threading.Lock()
+
 def _sanitize_filename(filename):
     """Windowsでも使えるようにファイル名をサニタイズする"""
     return re.sub(r'[\\/:*?"<>|]', '_', filename)
 
+def get_processed_store():
+    """成功・失敗ログの索引（ProcessedStore）を返す。初回呼び出し時にCSVログの追記分を取り込む"""
+    global _processed_store
+    with _processed_store_lock:
+        if _processed_store is None:
+            _processed_store = ProcessedStore('transcript', [SUCCESS_LOG_FILE, FAILURE_LOG_FILE])
+    return _processed_store
+
 def authenticate():
-    """token.jsonを使って認証し、Drive APIサービスオブジェクトを返す"""
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        print("\nエラー: 認証情報(token.json)が無効です。", file=sys.stderr)
-        print("`python a00_start.py`を先に実行して、認証を完了させてください。\n", file=sys.stderr)
-        return None
-    if creds.expired and creds.refresh_token:
-        creds.refresh(Request())
-    return build('drive', 'v3', credentials=creds)
+    """token.jsonを使って認証し、Drive APIサービスオブジェクトを返す（スレッドごとに使い回される）"""
+    return m01_drive_client.get_service()
 
 def list_new_videos(service):
     """指定されたフォルダから、まだ処理していない動画ファイルのリストを取得する"""
@@ -50,34 +78,92 @@ geminiから、修正しても良いですかと英語で聞かれますので
         print(errmsg, file=sys.stderr)
         return []
 
-    processed_ids = set()
-    for log_file in [SUCCESS_LOG_FILE, FAILURE_LOG_FILE]:
-        if os.path.exists(log_file):
-            with open(log_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line != "":
-                        processed_ids.add(line.strip().split(',')[1])
-    
+    # ログ全体を読み直さず、前回から追記された行だけを索引に取り込む
+    store = get_processed_store()
+    store.import_logs()
+
+    if not INCREMENTAL_SCAN:
+        return [video for video in _list_folder_videos(service) if not store.is_processed(video.get('id'))]
+
+    page_token = store.get_meta('changes_page_token')
+    # フォルダや対象のファイル種別が変わった場合は、これまでの一覧を使わずにフルスキャンする
+    if (page_token and store.get_meta('scan_folder_id') == SHARED_DRIVE_FOLDER_ID
+            and store.get_meta('scan_mime_prefixes') == ','.join(MEDIA_MIME_PREFIXES)):
+        try:
+            _apply_drive_changes(service, store, page_token)
+            return store.unprocessed_folder_files()
+        except HttpError as e:
+            if e.resp.status not in (400, 404, 410):
+                raise
+            print(f"page token が無効になったため、フォルダ全体をスキャンし直します（HTTP {e.resp.status}）。")
+
+    # 一覧の取得中に行われた変更を取りこぼさないよう、フルスキャンの前に開始位置の token を取得する
+    start_page_token = service.changes().getStartPageToken(supportsAllDrives=True).execute()['startPageToken']
+    store.replace_folder_files(_list_folder_videos(service))
+    store.set_meta('scan_folder_id', SHARED_DRIVE_FOLDER_ID)
+    store.set_meta('scan_mime_prefixes', ','.join(MEDIA_MIME_PREFIXES))
+    store.set_meta('changes_page_token', start_page_token)
+    return store.unprocessed_folder_files()
+
+def _list_folder_videos(service):
+    """フォルダ内の動画・音声ファイルを、作成日時順に全件取得する"""
     print(f"'{SHARED_DRIVE_FOLDER_ID}'をスキャンしています...")
-    new_videos = []
+    mime_query = ' or '.join(f"mimeType contains '{prefix}'" for prefix in MEDIA_MIME_PREFIXES)
+    videos = []
     page_token = None
     while True:
         response = service.files().list(
-            q=f"'{SHARED_DRIVE_FOLDER_ID}' in parents and (mimeType contains 'video/') and trashed = false",
+            q=f"'{SHARED_DRIVE_FOLDER_ID}' in parents and ({mime_query}) and trashed = false",
             spaces='drive',
-            fields='nextPageToken, files(id, name, fileExtension)',
+            fields=f'nextPageToken, files({VIDEO_FIELDS})',
             orderBy='createdTime',
             pageToken=page_token,
             supportsAllDrives=True,
             includeItemsFromAllDrives=True
         ).execute()
-        for file in response.get('files', []):
-            if file.get('id') not in processed_ids:
-                new_videos.append(file)
+        videos.extend(response.get('files', []))
         page_token = response.get('nextPageToken', None)
         if page_token is None:
             break
-    return new_videos
+    return videos
+
+def _apply_drive_changes(service, store, page_token):
+    """
+    page_token 以降の Drive の変更を取得し、フォルダ内の動画一覧（store）に反映する。
+    全ての変更を反映できた場合のみ、次回用の page token を保存する。
+    """
+    print(f"'{SHARED_DRIVE_FOLDER_ID}'の前回以降の変更を確認しています...")
+    # 同じファイルに複数の変更があった場合は最後の変更を採用する（None はフォルダの対象外）
+    latest = {}
+    while True:
+        response = service.changes().list(
+            pageToken=page_token,
+            spaces='drive',
+            fields=f'nextPageToken, newStartPageToken, changes(changeType, fileId, removed, file({VIDEO_FIELDS}, mimeType, parents, trashed))',
+            pageSize=1000,
+            supportsAllDrives=True,
+            includeItemsFromAllDrives=True
+        ).execute()
+        for change in response.get('changes', []):
+            if change.get('changeType', 'file') != 'file':
+                continue
+            file = change.get('file') or {}
+            if (not change.get('removed') and not file.get('trashed')
+                    and SHARED_DRIVE_FOLDER_ID in file.get('parents', [])
+                    and file.get('mimeType', '').startswith(MEDIA_MIME_PREFIXES)):
+                latest[change.get('fileId')] = {key: file[key] for key in VIDEO_FIELDS.split(', ') if key in file}
+            else:
+                # 削除・ゴミ箱への移動・他フォルダへの移動などで対象外になったファイル
+                latest[change.get('fileId')] = None
+        if 'newStartPageToken' in response:
+            break
+        page_token = response['nextPageToken']
+
+    upserts = [file for file in latest.values() if file is not None]
+    removed_ids = [file_id for file_id, file in latest.items() if file is None]
+    print(f"  -> {len(upserts)}件の動画が追加・更新されました。")
+    store.update_folder_files(upserts, removed_ids)
+    store.set_meta('changes_page_token', response['newStartPageToken'])
 
 def log_success(file_id, file_name, log_file_path):
     print(f"DEBUG: log_success() CALLED for {file_name} -> {log_file_path}", file=sys.stderr)
@@ -108,21 +194,271 @@ def log_failure(file_id, file_name, error, log_file_path):
     except IOError as e:
         print(f"失敗ログの書き込み中にエラー: {e}", file=sys.stderr)
 
-def download_video(service, file_id, file_name):
-    """ファイルをダウンロードする"""
-    if not os.path.exists(DOWNLOADS_DIR):
-        os.makedirs(DOWNLOADS_DIR)
-    
-    local_path = os.path.join(DOWNLOADS_DIR, _sanitize_filename(file_name))
+def _partial_paths(file_id):
+    """
+    ダウンロード途中のデータと、その状態ファイル（サイドカー）のパスを返す。
+    同じファイル名で再アップロードされた動画をバッチモードで同時にダウンロードしても衝突しないよう、
+    ファイル名ではなく Drive のファイルIDで名前を付ける。
+    """
+    name = _sanitize_filename(file_id)
+    return (os.path.join(PARTIAL_DOWNLOADS_DIR, f"{name}.part"),
+            os.path.join(PARTIAL_DOWNLOADS_DIR, f"{name}.part.json"))
+
+def _load_download_state(state_path, file_id, size, md5_checksum):
+    """状態ファイルを読み込む。別のファイルや更新後のファイルの状態であれば None を返す"""
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if (state.get('file_id'), state.get('size'), state.get('md5Checksum')) != (file_id, size, md5_checksum):
+        return None
+    return state
+
+def _save_download_state(state_path, state):
+    """状態ファイルを一時ファイル経由で置き換え、書き込み途中で壊れないようにする"""
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+def _fetch_range(request, start, end, http=None):
+    """get_media リクエストのURIに Range ヘッダを付けて、指定バイト範囲を取得する"""
+    resp, content = (http or request.http).request(
+        request.uri, method='GET', headers={'range': f'bytes={start}-{end}'}
+    )
+    if resp.status not in (200, 206, 416):
+        raise IOError(f"HTTP {resp.status}: {content[:200]!r}")
+    return resp, content
+
+def _fetch_range_with_retry(request, start, end, size=None, exact=False, connect=None):
+    """
+    _fetch_range で start-end の範囲を取得し、失敗した場合は DOWNLOAD_MAX_RETRIES 回まで待ち時間を延ばしながら再試行する。
+    size（ファイル全体のサイズ）が分かっている場合は範囲がファイル内にあるはずなので、416 と、206 で空の応答
+    （exact が True の場合は要求より短い応答）も失敗として再試行する。
+    connect を渡した場合は試行ごとに connect() で接続を取得する（失敗した接続は使い回さずに捨てる）。
+    (resp, content, 使った接続) を返す。
+    """
+    retries = 0
+    while True:
+        http = connect() if connect else None
+        try:
+            resp, content = _fetch_range(request, start, end, http=http)
+            if size is not None:
+                if resp.status == 416:
+                    raise IOError(f"HTTP 416: ファイルサイズが {size} バイトではありません")
+                if resp.status == 206 and (len(content) != end - start + 1 if exact else not content):
+                    raise IOError(f"{end - start + 1}バイト中{len(content)}バイトしか取得できませんでした")
+            return resp, content, http
+        except Exception as e:
+            retries += 1
+            if retries > DOWNLOAD_MAX_RETRIES:
+                raise
+            wait = min(2 ** retries, 30)
+            print(f"  -> 範囲 {start}-{end} の取得に失敗しました（{e}）。{wait}秒後に再試行します。")
+            time.sleep(wait)
+
+def _download_sequential(request, part_path, state_path, state):
+    """
+    DOWNLOAD_CHUNK_SIZE ずつ先頭から順に取得して part_path に書き込み、ファイル全体のサイズを返す。
+    1チャンクごとに state['offset'] を更新するため、途中で失敗しても続きから再開できる。
+    """
+    size = state['size']
+    offset = state['offset']
+    # 先頭から書き直すため、並列ダウンロードで取得済みの範囲は引き継がない
+    state.pop('range_size', None)
+    state.pop('ranges_done', None)
+    with open(part_path, 'r+b' if offset else 'wb') as fh:
+        fh.truncate(offset)
+        fh.seek(offset)
+        while size is None or offset < size:
+            end = offset + DOWNLOAD_CHUNK_SIZE - 1
+            if size is not None:
+                end = min(end, size - 1)
+            requested = end - offset + 1
+            resp, content, _ = _fetch_range_with_retry(request, offset, end, size)
+
+            if resp.status == 416:
+                # 取得済みの位置がファイル末尾に達している（サイズが分からない場合のみ）
+                break
+            if resp.status == 200 and offset:
+                # サーバーが Range を無視してファイル全体を返した場合は先頭から書き直す
+                fh.seek(0)
+                fh.truncate(0)
+                offset = 0
+
+            fh.write(content)
+            fh.flush()
+            os.fsync(fh.fileno())
+            offset += len(content)
+            state['offset'] = offset
+            _save_download_state(state_path, state)
+
+            if resp.status == 200:
+                break
+            if size is None:
+                # Content-Range: bytes start-end/total から全体のサイズを取得する
+                total = resp.get('content-range', '').rpartition('/')[2]
+                size = int(total) if total.isdigit() else None
+                if size is None and len(content) < requested:
+                    break
+    return size
+
+def _acquire_connection(request):
+    """
+    並列取得に使う HTTP 接続を返す（httplib2 はスレッドセーフではないため、request.http は共有しない）。
+    Drive への接続は m01_drive_client の接続プールから借り、ファイルをまたいで使い回す。
+    """
+    if isinstance(request.http, google_auth_httplib2.AuthorizedHttp):
+        return m01_drive_client.acquire_http()
+    return build_http()
+
+def _release_connection(http):
+    if isinstance(http, google_auth_httplib2.AuthorizedHttp):
+        m01_drive_client.release_http(http)
+
+def _download_parallel(request, part_path, state_path, state, connections):
+    """
+    ファイルを DOWNLOAD_CHUNK_SIZE ごとのバイト範囲に分け、connections 本の接続で並列に取得する。
+
+    part_path は最終サイズで事前確保し、各範囲は取得できた順にそのオフセットへ書き込む。
+    完了した範囲は状態ファイルの ranges_done に記録するため、途中で失敗しても未取得の範囲だけを再取得できる。
+    サーバーが Range に対応しておらず全体を返してきた場合は False を返す。
+    """
+    size = state['size']
+    range_size = DOWNLOAD_CHUNK_SIZE
+    starts = list(range(0, size, range_size))
+    done = set()
+    if state.get('range_size') == range_size:
+        done.update(state.get('ranges_done', []))
+    # 逐次ダウンロードで取得済みの先頭部分も完了済みとして扱う
+    done.update(s for s in starts if min(s + range_size, size) <= state['offset'])
+    state['range_size'] = range_size
+    state['ranges_done'] = sorted(done)
+    pending = [s for s in starts if s not in done]
+    if done:
+        print(f"  -> {len(starts)}範囲のうち{len(done)}範囲は取得済みです。")
+    print(f"  -> {len(pending)}範囲を{connections}本の接続で並列に取得します。")
+
+    lock = threading.Lock()
+    range_unsupported = threading.Event()
+
+    def _fetch(start, fh):
+        end = min(start + range_size, size) - 1
+        if range_unsupported.is_set():
+            return None
+        started = time.time()
+        resp, content, http = _fetch_range_with_retry(
+            request, start, end, size, exact=True, connect=lambda: _acquire_connection(request)
+        )
+        _release_connection(http)
+        elapsed = max(time.time() - started, 1e-6)
+        if resp.status != 206:
+            range_unsupported.set()
+            return None
+
+        with lock:
+            fh.seek(start)
+            fh.write(content)
+            fh.flush()
+            os.fsync(fh.fileno())
+            done.add(start)
+            # 先頭から連続して取得済みの位置を offset に記録し、逐次ダウンロードでも再開できるようにする
+            offset = 0
+            while offset < size and offset in done:
+                offset = min(offset + range_size, size)
+            state['offset'] = max(state['offset'], offset)
+            state['ranges_done'] = sorted(done)
+            _save_download_state(state_path, state)
+        print(f"  -> 範囲 {start}-{end}: {len(content) / elapsed / (1024 * 1024):.1f} MB/s（{elapsed:.2f}秒）")
+        return len(content)
+
+    started = time.time()
+    total_bytes = 0
+    with open(part_path, 'r+b' if os.path.exists(part_path) else 'wb') as fh:
+        if os.path.getsize(part_path) != size:
+            fh.truncate(size)
+        executor = ThreadPoolExecutor(max_workers=connections)
+        try:
+            futures = [executor.submit(_fetch, start, fh) for start in pending]
+            for future in as_completed(futures):
+                fetched = future.result()
+                if fetched:
+                    total_bytes += fetched
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    if range_unsupported.is_set():
+        return False
+    elapsed = max(time.time() - started, 1e-6)
+    print(f"  -> 並列取得完了: {total_bytes}バイトを{elapsed:.2f}秒で取得しました"
+          f"（{total_bytes / elapsed / (1024 * 1024):.1f} MB/s、{connections}接続）。")
+    return True
+
+def download_video(service, file_id, file_name, expected_size=None, expected_md5=None, downloads_dir=None):
+    """
+    ファイルをダウンロードする。
+
+    取得済みのバイト位置を状態ファイルに記録しながら DOWNLOAD_CHUNK_SIZE ずつ取得するため、
+    途中で失敗しても次回は HTTP Range で続きから再開できる。
+    DOWNLOAD_CONNECTIONS が2以上で、ファイルが PARALLEL_DOWNLOAD_MIN_SIZE 以上の場合は
+    複数のバイト範囲を並列に取得する。
+    完了後は Drive の size / md5Checksum と照合し、一致した場合のみ downloads_dir（省略時は DOWNLOADS_DIR）に配置する。
+    """
+    local_path = local_video_path(file_name, downloads_dir)
+    # バッチモードでは複数スレッドから同時に呼ばれるため exist_ok で作成する
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    os.makedirs(PARTIAL_DOWNLOADS_DIR, exist_ok=True)
+
+    part_path, state_path = _partial_paths(file_id)
     #print(f"  -> '{file_name}' をダウンロード中...", end="", flush=True)
     print(f"  -> '{file_name}' をダウンロード中...\n")
     try:
+        if expected_size is None or expected_md5 is None:
+            metadata = service.files().get(
+                fileId=file_id, fields='size, md5Checksum', supportsAllDrives=True
+            ).execute()
+            expected_size = metadata.get('size')
+            expected_md5 = metadata.get('md5Checksum')
+        size = int(expected_size) if expected_size is not None else None
+
+        offset = 0
+        previous = _load_download_state(state_path, file_id, size, expected_md5)
+        if previous and os.path.exists(part_path):
+            # 状態ファイルに記録された位置までが、書き込みの完了したデータ
+            offset = min(previous['offset'], os.path.getsize(part_path))
+            print(f"  -> 前回の続き（{offset}バイト目）から再開します。")
+        state = {'file_id': file_id, 'size': size, 'md5Checksum': expected_md5, 'offset': offset}
+        if previous and os.path.exists(part_path) and os.path.getsize(part_path) == size:
+            # 並列ダウンロードで取得済みの範囲（事前確保されたファイル内に書き込み済み）を引き継ぐ
+            state['range_size'] = previous.get('range_size')
+            state['ranges_done'] = previous.get('ranges_done', [])
+
         request = service.files().get_media(fileId=file_id, supportsAllDrives=True)
-        with io.FileIO(local_path, 'wb') as fh:
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
+        if DOWNLOAD_CONNECTIONS > 1 and size is not None and size >= PARALLEL_DOWNLOAD_MIN_SIZE:
+            if not _download_parallel(request, part_path, state_path, state, DOWNLOAD_CONNECTIONS):
+                print("  -> サーバーが Range に対応していないため、逐次ダウンロードに切り替えます。")
+                size = _download_sequential(request, part_path, state_path, state)
+        else:
+            size = _download_sequential(request, part_path, state_path, state)
+
+        actual_size = os.path.getsize(part_path)
+        if size is not None and actual_size != size:
+            print(f"失敗: サイズが一致しません（期待値 {size} / 実際 {actual_size}）。次回は続きから再開します。")
+            return False
+        if expected_md5:
+            actual_md5 = m04_result_store.file_md5(part_path)
+            if actual_md5 != expected_md5:
+                # 壊れたデータから再開しないよう、途中ファイルと状態ファイルを破棄する
+                os.remove(part_path)
+                os.remove(state_path)
+                print(f"失敗: md5Checksumが一致しません（期待値 {expected_md5} / 実際 {actual_md5}）。")
+                return False
+            print(f"  -> md5Checksumの検証に成功しました: {actual_md5}")
+
+        os.replace(part_path, local_path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
         print(f"{local_path} にダウンロードしました。")
         print(f"完了")
         return True
@@ -130,15 +466,161 @@ def download_video(service, file_id, file_name):
         print(f"失敗: {e}")
         return False
 
+def is_streamable(service, file_id, file_name):
+    """
+    動画を先頭から順に読むだけで ffmpeg が変換できるかを判定する。
+
+    mp4/mov は再生に必要な moov ボックスがファイル末尾にあると、パイプ入力では変換できない。
+    先頭から各ボックスのヘッダ（16バイト）だけを Range で取得し、moov が mdat より前にある場合のみ True を返す。
+    """
+    if os.path.splitext(file_name)[1].lower() not in MP4_EXTENSIONS:
+        return True
+    try:
+        request = service.files().get_media(fileId=file_id, supportsAllDrives=True)
+        pos = 0
+        for _ in range(16):
+            resp, header = _fetch_range(request, pos, pos + 15)
+            if resp.status != 206 or len(header) < 8:
+                return False
+            box_size = int.from_bytes(header[0:4], 'big')
+            box_type = header[4:8]
+            if box_size == 1 and len(header) >= 16:
+                box_size = int.from_bytes(header[8:16], 'big')
+            if box_type == b'moov':
+                return True
+            if box_type == b'mdat' or box_size < 8:
+                return False
+            pos += box_size
+    except Exception as e:
+        print(f"  -> ストリーミング可否の判定に失敗しました: {e}")
+    return False
+
+def stream_video(service, file_id, sink, expected_size=None, expected_md5=None):
+    """
+    ファイルを DOWNLOAD_CHUNK_SIZE ずつ取得し、ディスクに保存せずに sink（ffmpeg の標準入力など）へ順に書き込む。
+    書き込んだバイト列を Drive の size / md5Checksum と照合し、一致した場合のみ True を返す。
+    パイプは巻き戻せないため、失敗した場合は最初からやり直す必要がある。
+    """
+    print(f"  -> '{file_id}' をストリーミング中...\n")
+    try:
+        if expected_size is None or expected_md5 is None:
+            metadata = service.files().get(
+                fileId=file_id, fields='size, md5Checksum', supportsAllDrives=True
+            ).execute()
+            expected_size = metadata.get('size')
+            expected_md5 = metadata.get('md5Checksum')
+        if expected_size is None:
+            print("失敗: ファイルサイズが取得できないため、ストリーミングできません。")
+            return False
+        size = int(expected_size)
+
+        request = service.files().get_media(fileId=file_id, supportsAllDrives=True)
+        md5 = hashlib.md5()
+        offset = 0
+        while offset < size:
+            end = min(offset + DOWNLOAD_CHUNK_SIZE, size) - 1
+            resp, content, _ = _fetch_range_with_retry(request, offset, end, size)
+            if resp.status == 200 and offset:
+                raise IOError("サーバーが Range に対応していないため、続きから取得できません")
+
+            sink.write(content)
+            md5.update(content)
+            offset += len(content)
+            if resp.status == 200:
+                break
+        sink.flush()
+
+        if offset != size:
+            print(f"失敗: サイズが一致しません（期待値 {size} / 実際 {offset}）。")
+            return False
+        if expected_md5 and md5.hexdigest() != expected_md5:
+            print(f"失敗: md5Checksumが一致しません（期待値 {expected_md5} / 実際 {md5.hexdigest()}）。")
+            return False
+        print(f"  -> {offset}バイトをストリーミングしました。")
+        return True
+    except Exception as e:
+        # ffmpeg が途中で終了した場合は BrokenPipeError になる
+        print(f"失敗: {e}")
+        return False
+
 def log_entry(log_file, file_id, file_name, status):
-    """ログファイルにエントリを追記する"""
-    with open(log_file, 'a', encoding='utf-8') as f:
-        timestamp = datetime.now(timezone.utc).isoformat()
-        f.write(f"{timestamp},{file_id},{_sanitize_filename(file_name)},{status}\n")
+    """ログファイルにエントリを追記し、処理済みの索引にも記録する"""
+    get_processed_store().record(log_file, file_id, _sanitize_filename(file_name), status)
     print(f"ログを追記しました: {log_file}", file=sys.stderr)
 
-def main():
-    """メインの処理"""
+def _resolve_file_name(video):
+    """拡張子の無いファイル名には、Drive上の拡張子（無ければ.mp4）を補う"""
+    file_name_to_use = video['name']
+    base_name, current_ext = os.path.splitext(file_name_to_use)
+    if not current_ext:
+        drive_extension = video.get('fileExtension')
+        if drive_extension:
+            file_name_to_use = f"{file_name_to_use}.{drive_extension}"
+        else:
+            file_name_to_use = f"{file_name_to_use}.mp4"
+    return file_name_to_use
+
+def local_video_path(file_name, downloads_dir=None):
+    """download_video がダウンロードした動画の保存先パスを返す"""
+    return os.path.join(downloads_dir or DOWNLOADS_DIR, _sanitize_filename(file_name))
+
+def iter_downloaded_videos(max_videos=MAX_VIDEOS_PER_RUN, max_workers=MAX_CONCURRENT_DOWNLOADS, find_result=None,
+                           downloads_dir_for=None):
+    """
+    未処理の動画を最大 max_videos 件、max_workers 本の並列ストリームでダウンロードし、
+    完了した順に (file_id, file_name, local_path, ok) を返すジェネレータ。
+    find_result(video) が True を返す動画（処理結果を再利用できる動画）はダウンロードせず、
+    最初に local_path を None として返す。
+    downloads_dir_for(video) を渡した場合は、動画ごとにその戻り値のディレクトリへダウンロードする。
+
+    呼び出し側が1件を処理している間も、残りのダウンロードはバックグラウンドで継続する。
+    httplib2 はスレッドセーフではないため、サービスオブジェクトはスレッドごとのものを使う。
+    """
+    service = authenticate()
+    if not service:
+        return
+
+    videos_to_process = list_new_videos(service)
+    if not videos_to_process:
+        return
+    if max_videos:
+        videos_to_process = videos_to_process[:max_videos]
+
+    if find_result:
+        reused = [video for video in videos_to_process if find_result(video)]
+        for video in reused:
+            yield video['id'], _resolve_file_name(video), None, True
+        videos_to_process = [video for video in videos_to_process if video not in reused]
+
+    print(f"\n{len(videos_to_process)}件の動画を最大{max_workers}並列でダウンロードします。")
+
+    def _download(video, file_name):
+        service = authenticate()
+        downloads_dir = downloads_dir_for(video) if downloads_dir_for else None
+        local_path = local_video_path(file_name, downloads_dir)
+        ok = bool(service) and download_video(
+            service, video['id'], file_name, video.get('size'), video.get('md5Checksum'), downloads_dir
+        )
+        return video['id'], file_name, local_path, ok
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_download, video, _resolve_file_name(video))
+            for video in videos_to_process
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+def main(convert_stream=None, find_result=None, downloads_dir_for=None):
+    """
+    メインの処理。未処理の動画を1件ダウンロードし、(動画ID, ファイル名) を返す。
+    find_result(video) が True を返す動画（処理結果を再利用できる動画）はダウンロードしない。
+    downloads_dir_for(video) を渡した場合は、その戻り値のディレクトリへダウンロードする。
+
+    convert_stream を渡した場合、先頭から順に読んで変換できる動画はダウンロードせず、
+    convert_stream(write_to, file_name) に変換を任せる。write_to(sink) は動画のバイト列を sink に書き込み、
+    成功したかどうかを返す。ストリーミングできない動画は従来どおり DOWNLOADS_DIR にダウンロードする。
+    """
     service = authenticate()
     if not service:
         return
@@ -149,26 +631,33 @@ def main():
         return None,None
     
     print(f"\n{len(videos_to_process)}件の新しい動画が見つかりました。１件のみ処理を開始します。")
-    for i,video in enumerate(videos_to_process):
-        if i == 0:
-            file_name_to_use = video['name']
-            base_name, current_ext = os.path.splitext(file_name_to_use)
-            if not current_ext:
-                drive_extension = video.get('fileExtension')
-                if drive_extension:
-                    file_name_to_use = f"{file_name_to_use}.{drive_extension}"
-                else:
-                    file_name_to_use = f"{file_name_to_use}.mp4"
-
-            download_video(service, video['id'], file_name_to_use)
-            #if download_video(service, video['id'], file_name_to_use):
-                #log_entry(SUCCESS_LOG_FILE, video['id'], file_name_to_use, "SUCCESS")
-            #else:
-                #log_entry(FAILURE_LOG_FILE, video['id'], file_name_to_use, "FAILURE")
-            
+    video = videos_to_process[0]
+    file_name_to_use = _resolve_file_name(video)
+
+    if find_result and find_result(video):
+        return video['id'],file_name_to_use
+
+    # ストリーミングで変換する場合も、呼び出し側がこの動画の作業ディレクトリを用意できるよう先に呼ぶ
+    downloads_dir = downloads_dir_for(video) if downloads_dir_for else None
+    if convert_stream:
+        if is_streamable(service, video['id'], file_name_to_use):
+            def write_to(sink):
+                return stream_video(service, video['id'], sink, video.get('size'), video.get('md5Checksum'))
+            if not convert_stream(write_to, file_name_to_use):
+                raise RuntimeError(f"動画のストリーミング変換に失敗しました: {file_name_to_use}")
             return video['id'],file_name_to_use
-    
-    print("\n全ての処理が終了しました。")
+        print("  -> moov ボックスがファイル末尾にあるため、ダウンロードしてから変換します。")
+
+    if not download_video(service, video['id'], file_name_to_use, video.get('size'), video.get('md5Checksum'),
+                          downloads_dir):
+        # 失敗ログに動画IDを残さないことで、次回の実行で続きからダウンロードを再開させる
+        raise RuntimeError(f"動画のダウンロードに失敗しました: {file_name_to_use}（次回の実行で続きから再開します）")
+    #if download_video(service, video['id'], file_name_to_use):
+        #log_entry(SUCCESS_LOG_FILE, video['id'], file_name_to_use, "SUCCESS")
+    #else:
+        #log_entry(FAILURE_LOG_FILE, video['id'], file_name_to_use, "FAILURE")
+
+    return video['id'],file_name_to_use
 
 
 if __name__ == '__main__':
@@ -0,0 +1,262 @@
+#
+# ファイル名: m01_processed_store.py
+# 役割: 処理済みファイルの記録を SQLite で索引化し、ファイルIDでの照会を高速に行う
+#
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+# 索引のデータベースファイル。CSVログからいつでも作り直せるため、リポジトリにはコミットしない
+PROCESSED_DB_FILE = '.processed_items.sqlite3'
+# 読み込み済み位置の直前に記録しておくバイト数。ログが書き換えられていないかの確認に使う
+_TAIL_SIZE = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    namespace  TEXT NOT NULL,
+    file_id    TEXT NOT NULL,
+    file_name  TEXT,
+    status     TEXT,
+    updated_at TEXT,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    failures   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (namespace, file_id)
+);
+CREATE TABLE IF NOT EXISTS history (
+    namespace TEXT NOT NULL,
+    file_id   TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status    TEXT NOT NULL,
+    log_file  TEXT NOT NULL,
+    UNIQUE (namespace, file_id, timestamp, status)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    namespace TEXT NOT NULL,
+    key       TEXT NOT NULL,
+    value     TEXT,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS folder_files (
+    namespace    TEXT NOT NULL,
+    file_id      TEXT NOT NULL,
+    created_time TEXT,
+    metadata     TEXT NOT NULL,
+    PRIMARY KEY (namespace, file_id)
+);
+CREATE TABLE IF NOT EXISTS imported_logs (
+    log_file TEXT PRIMARY KEY,
+    offset   INTEGER NOT NULL,
+    tail     BLOB NOT NULL
+);
+"""
+
+
+def _read_tail(log_file, offset):
+    """ログの offset 直前の最大 _TAIL_SIZE バイトを返す"""
+    start = max(offset - _TAIL_SIZE, 0)
+    with open(log_file, 'rb') as f:
+        f.seek(start)
+        return f.read(offset - start)
+
+
+def _parse_log_line(line):
+    """
+    CSVログの1行 "timestamp,file_id,file_name,status" を分解する。
+    ファイル名にカンマが含まれていても、先頭2列と末尾1列を基準に分割する。
+    """
+    parts = line.strip().split(',')
+    if len(parts) < 2 or not parts[1]:
+        return None
+    timestamp, file_id = parts[0], parts[1]
+    if len(parts) >= 4:
+        file_name, status = ','.join(parts[2:-1]), parts[-1]
+    else:
+        file_name, status = ','.join(parts[2:]), ''
+    return timestamp, file_id, file_name, status
+
+
+class ProcessedStore:
+    """
+    processed_success.log などのCSVログと同じ内容を SQLite に保持し、
+    ファイルIDの照会・状態履歴・失敗回数を毎回ログを読み直さずに取得できるようにする。
+
+    CSVログはこれまでどおり追記され、GitHub Actions からコミットされる正本として残る。
+    索引にはログごとの読み込み済みバイト位置を記録し、次回以降は追記された行だけを取り込む。
+    ログが削除・書き換えされた場合は、namespace 内の索引をCSVログから作り直す。
+    """
+
+    def __init__(self, namespace, log_files, db_path=PROCESSED_DB_FILE):
+        self.namespace = namespace
+        self.log_files = list(log_files)
+        self._lock = threading.Lock()
+        # バッチモードではダウンロード用のスレッドとイベントループの両方から呼ばれる
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def _record_locked(self, file_id, file_name, status, timestamp, log_file):
+        """履歴を1件追加する。同じ履歴が取り込み済みの場合は何もしない"""
+        inserted = self._conn.execute(
+            "INSERT OR IGNORE INTO history (namespace, file_id, timestamp, status, log_file) VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, file_id, timestamp, status, log_file),
+        ).rowcount
+        if not inserted:
+            return
+        is_failure = 1 if log_file.endswith('failure.log') or 'FAIL' in status.upper() else 0
+        self._conn.execute(
+            """
+            INSERT INTO items (namespace, file_id, file_name, status, updated_at, attempts, failures)
+            VALUES (?, ?, ?, ?, ?, 1, ?)
+            ON CONFLICT (namespace, file_id) DO UPDATE SET
+                file_name = excluded.file_name,
+                status = CASE WHEN excluded.updated_at >= items.updated_at THEN excluded.status ELSE items.status END,
+                updated_at = MAX(items.updated_at, excluded.updated_at),
+                attempts = items.attempts + 1,
+                failures = items.failures + excluded.failures
+            """,
+            (self.namespace, file_id, file_name, status, timestamp, is_failure),
+        )
+
+    def _reset_locked(self):
+        """namespace 内の索引を削除し、全てのCSVログを先頭から取り込み直せるようにする"""
+        self._conn.execute("DELETE FROM items WHERE namespace = ?", (self.namespace,))
+        self._conn.execute("DELETE FROM history WHERE namespace = ?", (self.namespace,))
+        self._conn.executemany(
+            "DELETE FROM imported_logs WHERE log_file = ?",
+            [(os.path.abspath(log_file),) for log_file in self.log_files],
+        )
+
+    def import_logs(self):
+        """CSVログのうち、まだ取り込んでいない追記分だけを索引に取り込む"""
+        with self._lock:
+            offsets = {}
+            for log_file in self.log_files:
+                row = self._conn.execute(
+                    "SELECT offset, tail FROM imported_logs WHERE log_file = ?", (os.path.abspath(log_file),)
+                ).fetchone()
+                offset, tail = row if row else (0, b'')
+                size = os.path.getsize(log_file) if os.path.exists(log_file) else 0
+                if size < offset or (offset and _read_tail(log_file, offset) != tail):
+                    # ログが削除・置き換えされた場合（git pull で途中に行が入った場合を含む）は、
+                    # CSVログの内容に合わせて索引を作り直す
+                    print(f"INFO: {log_file} が変更されたため、処理済みの索引を作り直します。")
+                    self._reset_locked()
+                    offsets = {}
+                    break
+                offsets[log_file] = offset
+
+            imported = 0
+            for log_file in self.log_files:
+                if not os.path.exists(log_file):
+                    continue
+                offset = offsets.get(log_file, 0)
+                with open(log_file, 'rb') as f:
+                    f.seek(offset)
+                    for raw_line in f:
+                        if not raw_line.endswith(b'\n'):
+                            # 書き込み途中の行は次回に取り込む
+                            break
+                        offset += len(raw_line)
+                        parsed = _parse_log_line(raw_line.decode('utf-8', errors='replace'))
+                        if parsed:
+                            timestamp, file_id, file_name, status = parsed
+                            self._record_locked(file_id, file_name, status, timestamp, log_file)
+                            imported += 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO imported_logs (log_file, offset, tail) VALUES (?, ?, ?)",
+                    (os.path.abspath(log_file), offset, _read_tail(log_file, offset)),
+                )
+            self._conn.commit()
+            return imported
+
+    def record(self, log_file, file_id, file_name, status, timestamp=None):
+        """CSVログに1行追記し、同じ内容を索引にも記録する"""
+        if timestamp is None:
+            timestamp = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            with open(log_file, 'a', encoding='utf-8') as f:
+                f.write(f"{timestamp},{file_id},{file_name},{status}\n")
+            self._record_locked(file_id, file_name, status, timestamp, log_file)
+            self._conn.commit()
+
+    def is_processed(self, file_id):
+        """成功・失敗のいずれかのログに記録済みのファイルIDであれば True を返す"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM items WHERE namespace = ? AND file_id = ?", (self.namespace, file_id)
+            ).fetchone() is not None
+
+    def retry_count(self, file_id):
+        """ファイルIDが失敗として記録された回数を返す"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT failures FROM items WHERE namespace = ? AND file_id = ?", (self.namespace, file_id)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def history(self, file_id):
+        """ファイルIDの状態履歴を [(timestamp, status, log_file), ...] の時刻順で返す"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT timestamp, status, log_file FROM history WHERE namespace = ? AND file_id = ? ORDER BY timestamp",
+                (self.namespace, file_id),
+            ).fetchall()
+
+    def get_meta(self, key):
+        """namespace ごとに保存した値（Drive の changes page token など）を返す"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE namespace = ? AND key = ?", (self.namespace, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (namespace, key, value) VALUES (?, ?, ?)", (self.namespace, key, value)
+            )
+            self._conn.commit()
+
+    def replace_folder_files(self, files):
+        """監視対象フォルダ内のファイル一覧を、フルスキャンの結果で置き換える"""
+        with self._lock:
+            self._conn.execute("DELETE FROM folder_files WHERE namespace = ?", (self.namespace,))
+            self._conn.executemany(
+                "INSERT INTO folder_files (namespace, file_id, created_time, metadata) VALUES (?, ?, ?, ?)",
+                [(self.namespace, f['id'], f.get('createdTime'), json.dumps(f)) for f in files],
+            )
+            self._conn.commit()
+
+    def update_folder_files(self, upserts, removed_ids):
+        """Drive の変更（追加・更新されたファイルと、フォルダから外れたファイルID）を一覧に反映する"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO folder_files (namespace, file_id, created_time, metadata) VALUES (?, ?, ?, ?)",
+                [(self.namespace, f['id'], f.get('createdTime'), json.dumps(f)) for f in upserts],
+            )
+            self._conn.executemany(
+                "DELETE FROM folder_files WHERE namespace = ? AND file_id = ?",
+                [(self.namespace, file_id) for file_id in removed_ids],
+            )
+            self._conn.commit()
+
+    def unprocessed_folder_files(self):
+        """フォルダ内のファイルのうち、どのログにも記録されていないものを作成日時順に返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT f.metadata FROM folder_files f
+                WHERE f.namespace = ?
+                  AND NOT EXISTS (SELECT 1 FROM items i WHERE i.namespace = f.namespace AND i.file_id = f.file_id)
+                ORDER BY f.created_time, f.file_id
+                """,
+                (self.namespace,),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
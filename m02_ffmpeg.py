@@ -1,10 +1,83 @@
 import subprocess
 import os
-import shutil
+import re
+import json
 import glob
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 PYTHON_NAME = os.path.basename(__file__)
 
+# 音声のエンコード設定のプロファイル。
+# 文字起こしには話し声が聞き取れれば十分なため、サンプリングレートとビットレートを下げるとアップロードするサイズが減り、
+# 再生速度（tempo）を上げると Gemini に送る音声の秒数（入力トークン）が減る。
+# 精度とのバランスは z04_audio_profile_benchmark.py で比較できる。
+AUDIO_PROFILES = {
+    # これまでの設定（44.1kHz・64kbps AAC・1.3倍速）
+    "default": {"tempo": 1.3, "sample_rate": 44100, "codec": "aac", "bitrate": "64k", "format": "ipod", "extension": ".m4a"},
+    "speech_aac_32k": {"tempo": 1.3, "sample_rate": 16000, "codec": "aac", "bitrate": "32k", "format": "ipod", "extension": ".m4a"},
+    "speech_aac_24k_fast": {"tempo": 1.5, "sample_rate": 16000, "codec": "aac", "bitrate": "24k", "format": "ipod", "extension": ".m4a"},
+    "speech_opus_16k": {"tempo": 1.3, "sample_rate": 16000, "codec": "libopus", "bitrate": "16k", "format": "ogg", "extension": ".ogg"},
+    "speech_opus_12k_fast": {"tempo": 1.5, "sample_rate": 16000, "codec": "libopus", "bitrate": "12k", "format": "ogg", "extension": ".ogg"},
+    # 等速。モノラル・低ビットレートの AAC を含む入力は、再エンコードせずに分割する（classify_input を参照）
+    "original_speed": {"tempo": 1.0, "sample_rate": 44100, "codec": "aac", "bitrate": "64k", "format": "ipod", "extension": ".m4a"},
+}
+# 使用するプロファイル。変更する場合は set_audio_profile() を呼ぶ
+AUDIO_PROFILE = "default"
+# 入力の音声トラックを再エンコードせずに使う場合の ffmpeg の出力オプション
+AUDIO_COPY_ARGS = ["-vn", "-sn", "-dn", "-c:a", "copy"]
+# プロファイルのエンコーダ名と、ffprobe が報告するコーデック名の対応
+COPYABLE_CODECS = {"aac": "aac", "libopus": "opus"}
+# プロファイルの出力形式と、同じ形式の入力を ffprobe が報告する format_name の対応
+COPYABLE_FORMATS = {"ipod": "mp4", "ogg": "ogg"}
+# 入力のビットレートがプロファイルの何倍までなら、そのまま使うか（可変ビットレートの揺れを許容する）
+COPY_BITRATE_MARGIN = 1.25
+# True のとき、分割前の音声全体も m4a フォルダに出力する（分割と同じ1回の変換で書き出す）
+KEEP_FULL_M4A = False
+# True のとき、無音の位置を検出して、分割位置を segment_time 付近の話の切れ目に合わせる
+SILENCE_AWARE_SPLIT = True
+# 分割位置を探す範囲（分割後の音声での秒数）。segment_time ± この秒数の中で最も近い無音を選ぶ
+SPLIT_TOLERANCE = 30
+# 無音とみなす音量（dB）と、最短の長さ（秒）
+SILENCE_NOISE_DB = -35
+SILENCE_MIN_DURATION = 0.5
+# 各分割ファイルが元の動画のどの範囲にあたるかを記録するファイル（split_m4a フォルダ内）
+SEGMENT_MAP_FILE = "segment_map.json"
+# 分割ファイルごとに ffmpeg を起動して並列に変換する数。1の場合は1つの ffmpeg で先頭から順に変換する
+EXTRACT_WORKERS = os.cpu_count() or 1
+# ffmpeg が書き終えた分割ファイルの名前を1行ずつ追記する一覧（split_m4a フォルダ内）。
+# on_segment を指定した場合に、書き込み途中のファイルを渡さないよう、この一覧に載ったファイルだけを渡す
+SEGMENT_LIST_FILE = "segment_list.list"
+# 分割ファイルの一覧を確認する間隔（秒）
+SEGMENT_LIST_POLL_INTERVAL = 0.5
+
+
+def set_audio_profile(name):
+    """
+    AUDIO_PROFILES の name の設定を、以降の変換で使うようにする。
+
+    AUDIO_TEMPO: 音声の再生速度。分割後の音声の1秒は、元の動画の AUDIO_TEMPO 秒にあたる
+    AUDIO_ENCODE_ARGS: 動画から音声を取り出す ffmpeg の出力オプション
+    AUDIO_FORMAT / AUDIO_EXTENSION: 出力する音声ファイルの形式と拡張子
+    """
+    global AUDIO_PROFILE, AUDIO_TEMPO, AUDIO_ENCODE_ARGS, AUDIO_FORMAT, AUDIO_EXTENSION
+    if name not in AUDIO_PROFILES:
+        raise ValueError(f"不明な音声プロファイルです: {name}（{', '.join(AUDIO_PROFILES)} から選択）")
+    profile = AUDIO_PROFILES[name]
+    AUDIO_PROFILE = name
+    AUDIO_TEMPO = profile["tempo"]
+    AUDIO_FORMAT = profile["format"]
+    AUDIO_EXTENSION = profile["extension"]
+    AUDIO_ENCODE_ARGS = [
+        "-vn",
+        "-ac", "1",
+        "-af", f"atempo={AUDIO_TEMPO},aresample={profile['sample_rate']}",
+        "-ab", profile["bitrate"],
+        "-acodec", profile["codec"],
+    ]
+
+set_audio_profile(AUDIO_PROFILE)
+
 
 def split_audio(input_file, output_dir, segment_time, base_name):
     """
@@ -46,11 +119,7 @@ def convert_audio(input_file, output_file):
     command = [
         "ffmpeg",
         "-i", input_file,
-        "-vn",
-        "-ac", "1",
-        "-af", "atempo=1.3,aresample=44100",
-        "-ab", "64k",
-        "-acodec", "aac",
+        *AUDIO_ENCODE_ARGS,
         output_file
     ]
     try:
@@ -61,54 +130,502 @@ def convert_audio(input_file, output_file):
         print(f"エラーが発生しました: {e} : ({PYTHON_NAME})")
         return -1
 
-def main():
-    downloads_dir = os.path.join(os.path.expanduser("."), "downloads")
-    m4a_dir = "m4a"
-    split_m4a_dir = "split_m4a"
+def _parse_duration(ffmpeg_log):
+    """ffmpeg の出力の "Duration: 01:23:45.67" から、長さ（秒）を返す。見つからない場合は None を返す"""
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", ffmpeg_log)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def probe_duration(input_file):
+    """動画の長さ（秒）を返す。ffmpeg -i の情報表示だけを使い、デコードは行わない"""
+    # 出力先を指定していないため ffmpeg は終了コード 1 で終わるが、入力の情報は表示される
+    result = subprocess.run(["ffmpeg", "-hide_banner", "-i", input_file],
+                            capture_output=True, text=True, errors="replace")
+    return _parse_duration(result.stderr)
+
+def detect_silences(input_file, noise_db=SILENCE_NOISE_DB, min_duration=SILENCE_MIN_DURATION):
+    """
+    ffmpeg の silencedetect で無音区間を検出する（音声のデコードのみで、エンコードは行わない）。
+
+    Returns:
+        tuple: (動画の長さ（秒）, [(無音の開始秒, 無音の終了秒), ...])。時刻は元の動画の時刻。
+    """
+    command = [
+        "ffmpeg", "-hide_banner", "-nostats",
+        "-i", input_file,
+        "-vn", "-ac", "1",
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_duration}",
+        "-f", "null", "-"
+    ]
+    result = subprocess.run(command, check=True, capture_output=True, text=True, errors="replace")
+    duration = _parse_duration(result.stderr)
+
+    silences = []
+    start = None
+    for line in result.stderr.splitlines():
+        match = re.search(r"silence_start: (-?\d+(?:\.\d+)?)", line)
+        if match:
+            start = max(float(match.group(1)), 0.0)
+            continue
+        match = re.search(r"silence_end: (\d+(?:\.\d+)?)", line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    if start is not None and duration is not None:
+        # 無音のまま終わった場合
+        silences.append((start, duration))
+    return duration, silences
+
+def plan_segments(duration, silences, target, tolerance):
+    """
+    target 秒ごとの分割位置を、前後 tolerance 秒の範囲で最も近い無音区間の中央にずらす。
+    範囲内に無音が無い場合は target 秒の位置で分割する。
+
+    Returns:
+        list: [{"index", "start", "end", "duration"}, ...]。時刻は元の動画の秒数。
+    """
+    cuts = []
+    pos = 0.0
+    while duration - pos > target + tolerance:
+        ideal = pos + target
+        best = None
+        for start, end in silences:
+            point = (start + end) / 2
+            if point <= pos or abs(point - ideal) > tolerance:
+                continue
+            if best is None or abs(point - ideal) < abs(best - ideal):
+                best = point
+        cut = best if best is not None else ideal
+        cuts.append(cut)
+        pos = cut
+
+    bounds = [0.0] + cuts + [duration]
+    return [
+        {"index": i, "start": round(start, 3), "end": round(end, 3), "duration": round(end - start, 3)}
+        for i, (start, end) in enumerate(zip(bounds, bounds[1:]))
+    ]
+
+def _convert_and_split_command(input_file, output_dir, segment_time, base_name, full_output=None, segment_times=None,
+                               mode="transcode", segment_list=None):
+    """
+    動画を1回だけデコードして音声に変換し、指定時間ごとに分割して出力する ffmpeg のコマンドを返す。
+    segment_times（分割後の音声での秒数のリスト）を指定した場合は、その位置で分割する。
+    full_output を指定した場合は tee で分割前の音声全体も同時に書き出す。
+    mode が "copy" / "remux" の場合は、再エンコードせずに音声トラックをそのまま分割する。
+    segment_list を指定した場合は、分割ファイルを書き終えるたびにそのファイル名を segment_list に追記させる。
+    """
+    segment_path = os.path.join(output_dir, f"{base_name}_split%03d{AUDIO_EXTENSION}")
+    if segment_times:
+        split_options = [("segment_times", ",".join(f"{t:.3f}" for t in segment_times))]
+    else:
+        split_options = [("segment_time", str(segment_time))]
+    split_options.append(("reset_timestamps", "1"))
+    if segment_list:
+        split_options += [("segment_list", segment_list), ("segment_list_type", "flat")]
+    command = ["ffmpeg", "-i", input_file, *(AUDIO_ENCODE_ARGS if mode == "transcode" else AUDIO_COPY_ARGS)]
+    if full_output:
+        segment_options = ":".join(f"{name}={value}" for name, value in split_options)
+        return command + [
+            "-map", "0:a:0",
+            "-f", "tee",
+            f"[f=segment:{segment_options}]{segment_path}|[f={AUDIO_FORMAT}]{full_output}",
+        ]
+    command += ["-f", "segment"]
+    for name, value in split_options:
+        command += [f"-{name}", value]
+    return command + [segment_path]
+
+def _run_segmenter(command, output_dir, on_segment=None, stdin=None):
+    """
+    分割を行う ffmpeg を実行し、終了コードを返す。
+    on_segment を指定した場合は、ffmpeg の実行中に SEGMENT_LIST_FILE を確認し、
+    書き終えた分割ファイルのパスを1つずつ on_segment に渡す。
+    stdin に関数を指定した場合は、ffmpeg の標準入力を引数にして別スレッドで実行する。
+    """
+    process = subprocess.Popen(command, stdin=subprocess.PIPE if stdin else None)
+    feeder = None
+    if stdin:
+        feeder = ThreadPoolExecutor(max_workers=1)
+        fed = feeder.submit(stdin, process.stdin)
+
+    list_path = os.path.join(output_dir, SEGMENT_LIST_FILE)
+    notified = 0
+    try:
+        while True:
+            finished = process.poll() is not None
+            if on_segment and os.path.exists(list_path):
+                with open(list_path, 'r', encoding='utf-8') as f:
+                    # 改行まで書き込まれた行だけを、書き終えた分割ファイルとして扱う
+                    lines = f.read().split("\n")[:-1]
+                for line in lines[notified:]:
+                    on_segment(os.path.join(output_dir, line.strip()))
+                notified = len(lines)
+            if finished:
+                break
+            time.sleep(SEGMENT_LIST_POLL_INTERVAL)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+
+    if feeder:
+        feeder.shutdown()
+        return process.returncode, fed.result()
+    return process.returncode
+
+def convert_and_split(input_file, output_dir, segment_time, base_name, full_output=None, segment_times=None,
+                      mode="transcode", on_segment=None):
+    """
+    ffmpegを使って動画ファイルを音声に変換しながら、指定時間で分割して出力する。
+    convert_audio と split_audio を続けて実行するのと同じ結果を、1回のデコード・1つのプロセスで得る。
+
+    Args:
+        input_file (str): 入力動画ファイルのパス。
+        output_dir (str): 出力ファイルのディレクトリパス。
+        segment_time (int): 分割する時間（秒）。
+        base_name (str): 元のファイル名（拡張子なし）。
+        full_output (str | None): 分割前の音声全体の出力先。None の場合は出力しない。
+        segment_times (list | None): 分割位置（分割後の音声での秒数）。指定した場合は segment_time より優先する。
+        mode (str): classify_input が返す変換方法。"copy" / "remux" の場合は再エンコードしない。
+        on_segment (callable | None): 分割ファイルを書き終えるたびに、そのパスを引数にして呼ぶ関数。
+    """
+    if full_output and os.path.exists(full_output):
+        os.remove(full_output)
+    segment_list = _reset_segment_list(output_dir) if on_segment else None
+    command = _convert_and_split_command(input_file, output_dir, segment_time, base_name, full_output, segment_times,
+                                         mode, segment_list)
+    returncode = _run_segmenter(command, output_dir, on_segment)
+    if returncode != 0:
+        print(f"エラーが発生しました: ffmpeg が終了コード {returncode} で終了しました : ({PYTHON_NAME})")
+        return -1
+    print(f"変換・分割完了: .{output_dir} フォルダに出力 : ({PYTHON_NAME})")
+    return 0
+
+def _reset_segment_list(output_dir):
+    """前回の SEGMENT_LIST_FILE を削除し、そのパスを返す"""
+    os.makedirs(output_dir, exist_ok=True)
+    segment_list = os.path.join(output_dir, SEGMENT_LIST_FILE)
+    if os.path.exists(segment_list):
+        os.remove(segment_list)
+    return segment_list
+
+def convert_stream(write_to, output_dir, segment_time, base_name, on_segment=None):
+    """
+    標準入力から受け取った動画を、1つの ffmpeg プロセスで音声に変換しながら指定時間で分割する。
+    動画ファイルも分割前の m4a も作らないため、ダウンロードと変換・分割が並行して進む。
+
+    Args:
+        write_to (callable): 動画のバイト列を引数のファイルオブジェクトに書き込み、成功したかを返す関数。
+        output_dir (str): 出力ファイルのディレクトリパス。
+        segment_time (int): 分割する時間（秒）。
+        base_name (str): 元のファイル名（拡張子なし）。
+        on_segment (callable | None): 分割ファイルを書き終えるたびに、そのパスを引数にして呼ぶ関数。
+    """
+    segment_list = _reset_segment_list(output_dir) if on_segment else None
+    command = _convert_and_split_command("pipe:0", output_dir, segment_time, base_name, segment_list=segment_list)
+
+    def feed(stdin):
+        try:
+            return write_to(stdin)
+        finally:
+            try:
+                stdin.close()
+            except BrokenPipeError:
+                pass
+
+    returncode, written = _run_segmenter(command, output_dir, on_segment, stdin=feed)
+    if not written:
+        print(f"エラーが発生しました: 動画データの受信に失敗しました : ({PYTHON_NAME})")
+        return -1
+    if returncode != 0:
+        print(f"エラーが発生しました: ffmpeg が終了コード {returncode} で終了しました : ({PYTHON_NAME})")
+        return -1
+    print(f"変換・分割完了: .{output_dir} フォルダに出力 : ({PYTHON_NAME})")
+    return 0
+
+def extract_segments(input_file, output_dir, segments, base_name, workers=None, on_segment=None):
+    """
+    分割計画の範囲ごとに ffmpeg を起動し、最大 workers 個を並列に実行して音声に変換する。
+    出力ファイル名は convert_and_split と同じ {base_name}_split000{AUDIO_EXTENSION} からの連番になる。
+
+    Args:
+        input_file (str): 入力動画ファイルのパス。
+        output_dir (str): 出力ファイルのディレクトリパス。
+        segments (list): plan_segments が返す分割計画（時刻は元の動画の秒数）。
+        base_name (str): 元のファイル名（拡張子なし）。
+        workers (int | None): 同時に実行する ffmpeg の数。None の場合は EXTRACT_WORKERS に従う。
+        on_segment (callable | None): 分割ファイルを書き終えるたびに、そのパスを引数にして呼ぶ関数。
+    """
+    if workers is None:
+        workers = EXTRACT_WORKERS
+    os.makedirs(output_dir, exist_ok=True)
+
+    def extract(segment):
+        output_file = os.path.join(output_dir, f"{base_name}_split{segment['index']:03d}{AUDIO_EXTENSION}")
+        # -ss / -t を入力側に指定し、範囲の外はデコードしない
+        command = [
+            "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+            "-ss", f"{segment['start']:.3f}", "-t", f"{segment['duration']:.3f}",
+            "-i", input_file,
+            *AUDIO_ENCODE_ARGS,
+            output_file
+        ]
+        subprocess.run(command, check=True)
+        if on_segment:
+            on_segment(output_file)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            # list() で全ての結果を受け取り、1つでも失敗していれば例外を送出させる
+            list(executor.map(extract, segments))
+        print(f"変換・分割完了（{min(workers, len(segments))}並列）: .{output_dir} フォルダに出力 : ({PYTHON_NAME})")
+        return 0
+    except subprocess.CalledProcessError as e:
+        print(f"エラーが発生しました: {e} : ({PYTHON_NAME})")
+        return -1
+
+def probe_input(input_file):
+    """ffprobe で入力のコンテナと各ストリームの情報を取得する。解析できない場合は None を返す"""
+    command = [
+        "ffprobe", "-v", "error",
+        "-print_format", "json",
+        "-show_format", "-show_streams",
+        input_file
+    ]
+    try:
+        result = subprocess.run(command, check=True, capture_output=True, text=True, errors="replace")
+        return json.loads(result.stdout)
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        print(f"ffprobe で入力を解析できませんでした: {e} : ({PYTHON_NAME})")
+        return None
+
+def _bitrate(value):
+    """"64k" や "64000" のようなビットレートの表記を bps の整数に変換する"""
+    value = str(value).lower()
+    if value.endswith("k"):
+        return int(float(value[:-1]) * 1000)
+    return int(float(value))
+
+def classify_input(input_file):
+    """
+    入力を解析し、音声を取り出すための最も軽い方法を選ぶ。
+
+    Returns:
+        tuple: (方法, 理由)。方法は次のいずれか。音声トラックが無い場合は (None, 理由) を返す。
+            "copy": 音声だけのファイルで、コーデック・コンテナともにそのまま使えるため、分割だけ行う
+            "remux": 映像を含むが、音声トラックはそのまま使えるため、映像を除いて分割する
+            "transcode": デコード・フィルタ・エンコードを行う
+    """
+    info = probe_input(input_file)
+    if info is None:
+        return "transcode", "入力の情報が取得できないため"
+    streams = info.get("streams", [])
+    audio_streams = [stream for stream in streams if stream.get("codec_type") == "audio"]
+    if not audio_streams:
+        return None, "音声トラックがありません"
+    if AUDIO_TEMPO != 1:
+        return "transcode", f"再生速度を {AUDIO_TEMPO} 倍に変更するため（プロファイル: {AUDIO_PROFILE}）"
+
+    audio = audio_streams[0]
+    profile = AUDIO_PROFILES[AUDIO_PROFILE]
+    codec_name = COPYABLE_CODECS.get(profile["codec"], profile["codec"])
+    if audio.get("codec_name") != codec_name:
+        return "transcode", f"音声コーデックが {audio.get('codec_name')} のため（{codec_name} が必要）"
+    if audio.get("channels") != 1:
+        return "transcode", f"音声が {audio.get('channels')} チャンネルのため（モノラルが必要）"
+    bit_rate = audio.get("bit_rate") or info.get("format", {}).get("bit_rate")
+    if not bit_rate or _bitrate(bit_rate) > _bitrate(profile["bitrate"]) * COPY_BITRATE_MARGIN:
+        return "transcode", f"ビットレートが {bit_rate or '不明'} のため（{profile['bitrate']} 以下が必要）"
+
+    # アルバムアートなどの静止画は映像として扱わない
+    has_video = any(
+        stream.get("codec_type") == "video" and not stream.get("disposition", {}).get("attached_pic")
+        for stream in streams
+    )
+    format_name = info.get("format", {}).get("format_name", "")
+    if not has_video and COPYABLE_FORMATS[AUDIO_FORMAT] in format_name.split(","):
+        return "copy", f"{codec_name}・モノラル・{_bitrate(bit_rate) // 1000}kbps の音声ファイルのため"
+    return "remux", f"音声トラックが {codec_name}・モノラル・{_bitrate(bit_rate) // 1000}kbps のため、映像だけを取り除く"
+
+def plan_fixed_split(input_file, segment_time):
+    """
+    segment_time（分割後の音声での秒数）ごとに区切った分割計画を返す。
+    動画の長さが取得できない場合は None を返す。
+    """
+    duration = probe_duration(input_file)
+    if not duration:
+        return None
+    return plan_segments(duration, [], segment_time * AUDIO_TEMPO, 0)
+
+def plan_split(input_file, segment_time, tolerance=SPLIT_TOLERANCE):
+    """
+    無音を検出して分割計画を立てる。segment_time と tolerance は分割後の音声での秒数で指定する。
+    無音の検出に失敗した場合は None を返す（呼び出し側は segment_time ごとの分割に戻す）。
+    """
+    try:
+        duration, silences = detect_silences(input_file)
+    except subprocess.CalledProcessError as e:
+        print(f"無音の検出に失敗したため、{segment_time}秒ごとに分割します: {e} : ({PYTHON_NAME})")
+        return None
+    if not duration:
+        print(f"動画の長さが取得できないため、{segment_time}秒ごとに分割します。 : ({PYTHON_NAME})")
+        return None
+    segments = plan_segments(duration, silences, segment_time * AUDIO_TEMPO, tolerance * AUDIO_TEMPO)
+    print(f"無音{len(silences)}箇所を検出し、{len(segments)}個に分割します: "
+          f"{[segment['end'] for segment in segments[:-1]]} : ({PYTHON_NAME})")
+    return segments
+
+def write_segment_map(segments, split_m4a_dir, base_name):
+    """分割計画に出力ファイル名を加え、SEGMENT_MAP_FILE に保存する"""
+    segment_map = [dict(segment, file=f"{base_name}_split{segment['index']:03d}{AUDIO_EXTENSION}") for segment in segments]
+    os.makedirs(split_m4a_dir, exist_ok=True)
+    with open(os.path.join(split_m4a_dir, SEGMENT_MAP_FILE), 'w', encoding='utf-8') as f:
+        json.dump(segment_map, f, ensure_ascii=False, indent=2)
+    return segment_map
+
+def check_segment_map(segment_map, split_m4a_dir, base_name):
+    """
+    分割後の音声ファイルが分割計画と一致するか（計画の全てのファイルが有り、計画に無いファイルが無いか）を確認する。
+    一致しない場合はエラーを表示して False を返す。
+    """
+    pattern = os.path.join(glob.escape(split_m4a_dir), f"{glob.escape(base_name)}_split*{AUDIO_EXTENSION}")
+    written = sorted(os.path.basename(path) for path in glob.glob(pattern))
+    planned = sorted(segment["file"] for segment in segment_map)
+    if written != planned:
+        print(f"エラー: 分割ファイルが分割計画と一致しません（計画: {len(planned)}個 {planned}、"
+              f"出力: {len(written)}個 {written}） : ({PYTHON_NAME})")
+        return False
+    return True
+
+def load_segment_map(split_m4a_dir="split_m4a"):
+    """write_segment_map で保存した分割計画を返す。無い場合は None を返す"""
+    try:
+        with open(os.path.join(split_m4a_dir, SEGMENT_MAP_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+def _finish_split(split_m4a_dir, base_name):
+    """分割後の後処理として、空のテキストファイルを作成し、split_m4a フォルダの内容を表示する"""
+    # 【ここから追加】空のテキストファイルを作成
+    txt_filename = base_name + '.txt'
+    txt_filepath = os.path.join(split_m4a_dir, txt_filename)
+    with open(txt_filepath, 'w') as f:
+        f.write("") # 空のファイルを作成
+        #pass # 空のファイルを作成
+    print(f"空のテキストファイルを作成しました: {txt_filepath} : ({PYTHON_NAME})")
+    # 【ここまで追加】
+
+    print(f"split_m4aフォルダ内のファイル : ({PYTHON_NAME})")
+    for filename in os.listdir(split_m4a_dir):
+        print(f"{filename} : ({PYTHON_NAME})")
+    print(f"処理完了: {base_name} : ({PYTHON_NAME})")
+
+def main(input_file=None, keep_full_m4a=None, downloads_dir="downloads", m4a_dir="m4a", split_m4a_dir="split_m4a",
+         on_segment=None):
+    """
+    動画ファイルを音声に変換し、split_m4a フォルダに分割出力する。
+
+    Args:
+        input_file (str | None): 処理する動画・音声ファイルのパス。
+            省略時は downloads フォルダ内の最初のファイルを処理する。
+        keep_full_m4a (bool | None): True の場合、分割前の音声全体も m4a フォルダに出力する。None の場合は KEEP_FULL_M4A に従う。
+        downloads_dir / m4a_dir / split_m4a_dir (str): 入力を探すフォルダと出力先のフォルダ（ジョブの作業ディレクトリ内）。
+        on_segment (callable | None): 分割ファイルを書き終えるたびに、そのパスを引数にして呼ぶ関数。
+            全ての分割を待たずに文字起こしを始めるために使う（ffmpeg を待つスレッドから呼ばれる）。
+    """
     segment_time = 240 #240
+    if keep_full_m4a is None:
+        keep_full_m4a = KEEP_FULL_M4A
 
     try:
-        mp4_files = glob.glob(os.path.join(downloads_dir, "*.mp4"))
-        print(f"Found mp4 files: {mp4_files} : ({PYTHON_NAME})")
+        if input_file is None:
+            # 動画・音声のどちらも受け付ける（対象かどうかは ffprobe で判定する）
+            media_files = sorted(path for path in glob.glob(os.path.join(downloads_dir, "*")) if os.path.isfile(path))
+            print(f"Found media files: {media_files} : ({PYTHON_NAME})")
 
-        if not mp4_files:
-            print(f"エラー: downloadsフォルダに処理対象の.mp4ファイルが見つかりません。 : ({PYTHON_NAME})")
-            sys.exit(1)
+            if not media_files:
+                print(f"エラー: downloadsフォルダに処理対象のファイルが見つかりません。 : ({PYTHON_NAME})")
+                sys.exit(1)
 
-        input_file = mp4_files[0]
+            input_file = media_files[0]
         print(f"処理対象ファイル: {input_file} : ({PYTHON_NAME})")
 
-        base_name = os.path.splitext(os.path.basename(input_file))[0]
-        output_file = os.path.join(m4a_dir, f"{base_name}.m4a")
-
-        if convert_audio(input_file, output_file) != 0:
-            print(f"音声変換に失敗したため、処理を中断します。 : ({PYTHON_NAME})")
+        mode, reason = classify_input(input_file)
+        if mode is None:
+            print(f"エラー: {reason}。処理を中断します。 : ({PYTHON_NAME})")
             sys.exit(1)
+        print(f"変換方法: {mode}（{reason}） : ({PYTHON_NAME})")
 
-        if split_audio(output_file, split_m4a_dir, segment_time, base_name) != 0:
-            print(f"音声の分割に失敗したため、処理を中断します。 : ({PYTHON_NAME})")
-            sys.exit(1)
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        output_file = os.path.join(m4a_dir, f"{base_name}{AUDIO_EXTENSION}")
+
+        full_output = None
+        if keep_full_m4a:
+            os.makedirs(m4a_dir, exist_ok=True)
+            full_output = output_file
 
-        shutil.copy2(input_file, split_m4a_dir)
+        # 分割前の音声全体も出力する場合は、1つの ffmpeg で tee を使って書き出す。
+        # 再エンコードしない場合は十分に速いため、並列化しない
+        parallel = EXTRACT_WORKERS > 1 and not full_output and mode == "transcode"
+        segments = None
+        segment_map = None
+        if SILENCE_AWARE_SPLIT:
+            segments = plan_split(input_file, segment_time)
+        if segments is None and parallel:
+            segments = plan_fixed_split(input_file, segment_time)
+        if segments:
+            segment_map = write_segment_map(segments, split_m4a_dir, base_name)
 
-        # 【ここから追加】空のテキストファイルを作成
-        txt_filename = os.path.splitext(os.path.basename(input_file))[0] + '.txt'
-        txt_filepath = os.path.join(split_m4a_dir, txt_filename)
-        with open(txt_filepath, 'w') as f:
-            f.write("") # 空のファイルを作成
-            #pass # 空のファイルを作成
-        print(f"空のテキストファイルを作成しました: {txt_filepath} : ({PYTHON_NAME})")
-        # 【ここまで追加】
+        if segments and parallel and len(segments) > 1:
+            result = extract_segments(input_file, split_m4a_dir, segments, base_name, on_segment=on_segment)
+        else:
+            segment_times = None
+            if segments:
+                # ffmpeg には、速度変更後の音声での時刻で分割位置を渡す
+                segment_times = [segment["end"] / AUDIO_TEMPO for segment in segments[:-1]]
+                if not segment_times:
+                    # 分割計画が1つだけの場合は分割しない。segment_times が空だと segment_time で切られるため、
+                    # 音声全体より長い時間を指定する
+                    segment_time = int(segments[-1]["end"] / AUDIO_TEMPO) + 1
+            result = convert_and_split(input_file, split_m4a_dir, segment_time, base_name, full_output, segment_times,
+                                       mode, on_segment)
+        if result != 0:
+            print(f"音声の変換・分割に失敗したため、処理を中断します。 : ({PYTHON_NAME})")
+            sys.exit(1)
+        if segment_map and not check_segment_map(segment_map, split_m4a_dir, base_name):
+            print(f"分割ファイルと分割計画が一致しないため、処理を中断します。 : ({PYTHON_NAME})")
+            sys.exit(1)
 
-        print(f"split_m4aフォルダ内のファイル : ({PYTHON_NAME})")
-        for filename in os.listdir(split_m4a_dir):
-            print(f"{filename} : ({PYTHON_NAME})")
-        print(f"処理完了: {base_name} : ({PYTHON_NAME})")
+        _finish_split(split_m4a_dir, base_name)
 
     except Exception as e:
         print(f"予期せぬエラーが発生しました: {e} : ({PYTHON_NAME})")
         sys.exit(1)
 
+def main_stream(write_to, file_name, split_m4a_dir="split_m4a", on_segment=None):
+    """
+    Google Drive から受信中の動画を ffmpeg の標準入力に流し込み、split_m4a フォルダに分割出力する。
+    m01_google_drive_manager.main(convert_stream=...) から呼ばれる。成功した場合は True を返す。
+
+    Args:
+        write_to (callable): 動画のバイト列を引数のファイルオブジェクトに書き込む関数。
+        file_name (str): Google Drive 上の動画のファイル名。
+        split_m4a_dir (str): 出力先のフォルダ（ジョブの作業ディレクトリ内）。
+        on_segment (callable | None): 分割ファイルを書き終えるたびに、そのパスを引数にして呼ぶ関数。
+    """
+    segment_time = 240 #240
+
+    base_name = os.path.splitext(os.path.basename(file_name))[0]
+    print(f"処理対象ファイル（ストリーミング）: {file_name} : ({PYTHON_NAME})")
+    if convert_stream(write_to, split_m4a_dir, segment_time, base_name, on_segment) != 0:
+        print(f"音声の変換・分割に失敗したため、処理を中断します。 : ({PYTHON_NAME})")
+        return False
+    _finish_split(split_m4a_dir, base_name)
+    return True
+
 if __name__ == "__main__":
     main()
     print(f"Exit : ({PYTHON_NAME})")
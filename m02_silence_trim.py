@@ -0,0 +1,202 @@
+#
+# ファイル名: m02_silence_trim.py
+# 役割: 分割後の音声から長い無音を短縮し、Gemini にアップロードする秒数とサイズを減らす（任意の処理）
+#
+# 短縮前後の時刻の対応は split_m4a/trim_map.json に保存するため、文字起こしの時刻から元の動画の時刻を求められる。
+#
+
+import os
+import sys
+import json
+import glob
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import m02_ffmpeg
+
+PYTHON_NAME = os.path.basename(__file__)
+
+# True のとき、m00_main_mojiokosi.py が音声変換の後に無音の短縮を行う
+TRIM_SILENCE = False
+# この秒数（分割後の音声での秒数）以上続く無音を短縮する
+TRIM_MIN_SILENCE = 2.0
+# 短縮した無音の代わりに残す秒数。話の区切りが分かるよう、無音の前後に半分ずつ残す
+TRIM_KEEP_SILENCE = 0.5
+# 短縮前後の時刻の対応を記録するファイル（split_m4a フォルダ内）
+TRIM_MAP_FILE = "trim_map.json"
+# Gemini は音声1秒あたり32トークンとして入力トークンを数える
+GEMINI_TOKENS_PER_AUDIO_SECOND = 32
+
+
+def keep_intervals(duration, silences, min_silence, keep):
+    """
+    残す区間を [(開始秒, 終了秒), ...] で返す。
+    min_silence 秒以上の無音は、前後に keep / 2 秒ずつ残して取り除く。
+    """
+    kept = []
+    pos = 0.0
+    for start, end in silences:
+        if end - start < min_silence:
+            continue
+        cut_start, cut_end = start + keep / 2, end - keep / 2
+        if cut_start > pos:
+            kept.append((pos, cut_start))
+        pos = max(pos, cut_end)
+    if duration > pos:
+        kept.append((pos, duration))
+    return kept
+
+
+def trim_file(audio_file):
+    """
+    音声ファイルの長い無音を短縮して上書きする。
+
+    Returns:
+        dict: 短縮前後の秒数・バイト数と、短縮後の時刻から短縮前の時刻を求めるための区間のリスト
+            pieces: [{"trimmed_start", "original_start", "duration"}, ...]
+    """
+    size_before = os.path.getsize(audio_file)
+    duration, silences = m02_ffmpeg.detect_silences(audio_file, min_duration=TRIM_MIN_SILENCE)
+    duration = duration or 0.0
+    kept = keep_intervals(duration, silences, TRIM_MIN_SILENCE, TRIM_KEEP_SILENCE)
+    result = {
+        "duration_before": round(duration, 3),
+        "duration_after": round(duration, 3),
+        "bytes_before": size_before,
+        "bytes_after": size_before,
+        "pieces": [{"trimmed_start": 0.0, "original_start": 0.0, "duration": round(duration, 3)}],
+    }
+    if not duration or kept == [(0.0, duration)]:
+        return result
+
+    # aselect で残す区間のサンプルだけを通し、asetpts で時刻を詰める
+    expression = "+".join(f"between(t,{start:.3f},{end:.3f})" for start, end in kept)
+    profile = m02_ffmpeg.AUDIO_PROFILES[m02_ffmpeg.AUDIO_PROFILE]
+    # 書き込み途中のファイルを分割ファイル（*_split*.m4a など）として扱わないよう、拡張子を付けない隠しファイルに書き出す
+    trimmed_file = os.path.join(os.path.dirname(audio_file), f".{os.path.basename(audio_file)}.trimtmp")
+    command = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-i", audio_file,
+        "-af", f"aselect='{expression}',asetpts=N/SR/TB",
+        "-ab", profile["bitrate"],
+        "-acodec", profile["codec"],
+        "-f", profile["format"],
+        trimmed_file
+    ]
+    try:
+        subprocess.run(command, check=True)
+        os.replace(trimmed_file, audio_file)
+    finally:
+        if os.path.exists(trimmed_file):
+            os.remove(trimmed_file)
+
+    pieces = []
+    trimmed_start = 0.0
+    for start, end in kept:
+        pieces.append({"trimmed_start": round(trimmed_start, 3), "original_start": round(start, 3),
+                       "duration": round(end - start, 3)})
+        trimmed_start += end - start
+    result.update(
+        duration_after=round(trimmed_start, 3),
+        bytes_after=os.path.getsize(audio_file),
+        pieces=pieces,
+    )
+    return result
+
+
+def original_time(trim_map, file_name, trimmed_time):
+    """
+    短縮後の音声ファイル file_name の trimmed_time 秒が、元の動画の何秒にあたるかを返す。
+    分割計画（segment_map.json）が無い場合は、短縮前の分割ファイルでの秒数を返す。
+    """
+    entry = trim_map["files"][file_name]
+    piece = entry["pieces"][0]
+    for candidate in entry["pieces"]:
+        if candidate["trimmed_start"] <= trimmed_time:
+            piece = candidate
+    segment_time = piece["original_start"] + (trimmed_time - piece["trimmed_start"])
+    if entry.get("source_start") is None:
+        return segment_time
+    return entry["source_start"] + segment_time * trim_map["tempo"]
+
+
+def load_trim_map(split_m4a_dir="split_m4a"):
+    """main が保存した時刻の対応を返す。無い場合は None を返す"""
+    try:
+        with open(os.path.join(split_m4a_dir, TRIM_MAP_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def trim_segment(audio_file):
+    """
+    trim_file で1つの分割ファイルの無音を短縮する。短縮に失敗した場合は None を返し、ファイルはそのまま残す。
+    m00_main_mojiokosi.py が、ffmpeg が書き終えた分割ファイルから順に呼ぶ。
+    """
+    try:
+        return trim_file(audio_file)
+    except subprocess.CalledProcessError as e:
+        print(f"無音の短縮に失敗したため、そのまま使います: {audio_file} : {e} : ({PYTHON_NAME})")
+        return None
+
+
+def main(split_m4a_dir="split_m4a"):
+    """
+    split_m4a フォルダの分割ファイルの長い無音を短縮し、時刻の対応を TRIM_MAP_FILE に保存する。
+    短縮に失敗したファイルは、短縮せずにそのまま文字起こしに回す。
+
+    Returns:
+        dict: 短縮前後の秒数・バイト数の合計と、削減できた推定トークン数
+    """
+    audio_files = sorted(
+        path for pattern in ("*_split*.m4a", "*_split*.ogg")
+        for path in glob.glob(os.path.join(split_m4a_dir, pattern))
+    )
+    if not audio_files:
+        print(f"{split_m4a_dir} に無音を短縮する音声ファイルがありません。 : ({PYTHON_NAME})")
+        return None
+
+    with ThreadPoolExecutor(max_workers=max(m02_ffmpeg.EXTRACT_WORKERS, 1)) as executor:
+        results = list(executor.map(trim_segment, audio_files))
+    return write_trim_map(split_m4a_dir, dict(zip(audio_files, results)))
+
+
+def write_trim_map(split_m4a_dir, results):
+    """
+    trim_segment の結果（音声ファイルのパス -> 結果）から時刻の対応を TRIM_MAP_FILE に保存し、削減量を表示する。
+
+    Returns:
+        dict: 短縮前後の秒数・バイト数の合計と、削減できた推定トークン数
+    """
+    segment_starts = {segment["file"]: segment["start"] for segment in m02_ffmpeg.load_segment_map(split_m4a_dir) or []}
+    trim_map = {"tempo": m02_ffmpeg.AUDIO_TEMPO, "files": {}}
+    for audio_file, result in sorted(results.items()):
+        if result is None:
+            continue
+        file_name = os.path.basename(audio_file)
+        result["source_start"] = segment_starts.get(file_name)
+        trim_map["files"][file_name] = result
+    with open(os.path.join(split_m4a_dir, TRIM_MAP_FILE), 'w', encoding='utf-8') as f:
+        json.dump(trim_map, f, ensure_ascii=False, indent=2)
+
+    entries = trim_map["files"].values()
+    summary = {
+        "seconds_before": sum(entry["duration_before"] for entry in entries),
+        "seconds_after": sum(entry["duration_after"] for entry in entries),
+        "bytes_before": sum(entry["bytes_before"] for entry in entries),
+        "bytes_after": sum(entry["bytes_after"] for entry in entries),
+    }
+    saved_seconds = summary["seconds_before"] - summary["seconds_after"]
+    summary["tokens_saved"] = int(saved_seconds * GEMINI_TOKENS_PER_AUDIO_SECOND)
+    print(f"無音を短縮しました: {summary['seconds_before']:.1f}秒 -> {summary['seconds_after']:.1f}秒"
+          f"（{saved_seconds:.1f}秒削減）、"
+          f"{summary['bytes_before'] / 1024:.0f}KB -> {summary['bytes_after'] / 1024:.0f}KB、"
+          f"推定 {summary['tokens_saved']} トークン削減 : ({PYTHON_NAME})")
+    return summary
+
+
+if __name__ == "__main__":
+    if main() is None:
+        sys.exit(1)
+    print(f"Exit : ({PYTHON_NAME})")
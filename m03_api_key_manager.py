@@ -1,5 +1,6 @@
 import os
 import json
+import time
 import asyncio
 from dotenv import load_dotenv
 import inspect  # --- ▼▼▼ 修正ポイント1: inspectモジュールをインポート ▼▼▼ ---
@@ -30,6 +31,8 @@ class ApiKeyManager:
         self._api_keys: list[str] = []
         self._current_index: int = -1
         self._key_selection_lock = asyncio.Lock()
+        # 割り当て量を使い切った APIキー -> 再び使えるようになる時刻
+        self._cooldown_until: dict[str, float] = {}
         
         self._load_api_keys_from_env()
         self._load_session()
@@ -98,7 +101,15 @@ class ApiKeyManager:
 
         async with self._key_selection_lock:
             # ラウンドロビン方式で次のインデックスを計算
-            self._current_index = (self._current_index + 1) % len(self._api_keys)
+            # 割り当て量を使い切って休ませているキーは飛ばす（全てのキーを休ませている場合は、そのまま次のキーを使う）
+            now = time.time()
+            for offset in range(1, len(self._api_keys) + 1):
+                index = (self._current_index + offset) % len(self._api_keys)
+                if self._cooldown_until.get(self._api_keys[index], 0) <= now:
+                    break
+            else:
+                index = (self._current_index + 1) % len(self._api_keys)
+            self._current_index = index
             
             selected_key = self._api_keys[self._current_index]
             
@@ -107,6 +118,24 @@ class ApiKeyManager:
             
             return selected_key
 
+    def report_quota_error(self, key: str, seconds: float):
+        """
+        key の割り当て量を使い切った（429 / RESOURCE_EXHAUSTED）ことを記録し、
+        seconds 秒の間は get_next_key で他のキーを優先して返す。
+        """
+        self._cooldown_until[key] = max(self._cooldown_until.get(key, 0), time.time() + seconds)
+        print(f"[{self.__class__.__name__}] APIkey: {key[-4:]} を {seconds:.0f}秒間 休ませます。")
+
+    def cooldown_remaining(self, key: str) -> float:
+        """report_quota_error で休ませている key を、あと何秒休ませるかを返す"""
+        return max(0.0, self._cooldown_until.get(key, 0) - time.time())
+
+    def next_available_in(self) -> float:
+        """休ませていないキーがあれば 0 を、全てのキーを休ませている場合は最初に使えるようになるまでの秒数を返す"""
+        if not self._api_keys:
+            return 0.0
+        return min(self.cooldown_remaining(key) for key in self._api_keys)
+
     @property
     def last_used_key_info(self) -> dict:
         if self._current_index == -1 or not self._api_keys:
@@ -0,0 +1,69 @@
+#
+# ファイル名: m03_gemini_client.py
+# 役割: APIキーごとに1つの Gemini クライアントを保持し、非同期インターフェース（client.aio）を返す
+#
+# 呼び出しのたびに genai.Client を作ると、毎回 HTTP 接続（TLS ハンドシェイク）からやり直しになる。
+# ここで作ったクライアントを使い回すことで、同じ APIキーのリクエストは接続を再利用できる。
+# また asyncio.to_thread を使わないため、同時リクエスト数がスレッドプールの大きさに制限されない。
+#
+
+import os
+import asyncio
+import logging
+from google import genai
+from google.genai import types
+
+PYTHON_NAME = os.path.basename(__file__)
+
+# 1つの APIキーで同時に開いておく HTTP 接続の上限
+MAX_CONNECTIONS_PER_KEY = 20
+
+# APIキー -> genai.Client
+_clients = {}
+# _clients を作ったイベントループ。asyncio.run が終わると接続も使えなくなるため、ループが変わったら作り直す
+_clients_loop = None
+
+
+def get_client(api_key):
+    """
+    api_key 用の非同期クライアント（genai.Client.aio）を返す。
+    実行中のイベントループの中から呼ぶこと。
+    """
+    global _clients_loop
+    loop = asyncio.get_running_loop()
+    if _clients_loop is not loop:
+        # 前のイベントループで作った接続は閉じられないため、参照を捨てて作り直す
+        _clients.clear()
+        _clients_loop = loop
+    client = _clients.get(api_key)
+    if client is None:
+        client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(
+                async_client_args={"limits": _connection_limits()},
+            ),
+        )
+        _clients[api_key] = client
+        logging.info(f"Gemini クライアントを作成しました Key:{api_key[-4:]} : ({PYTHON_NAME})")
+    return client.aio
+
+
+def _connection_limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS_PER_KEY,
+        max_keepalive_connections=MAX_CONNECTIONS_PER_KEY,
+    )
+
+
+async def close_clients():
+    """保持しているクライアントの接続を閉じる。イベントループを終える前に呼ぶ"""
+    global _clients_loop
+    clients = list(_clients.values())
+    _clients.clear()
+    _clients_loop = None
+    for client in clients:
+        try:
+            await client.aio.aclose()
+        except Exception as e:
+            logging.warning(f"Gemini クライアントを閉じる際にエラーが発生しました: {e} : ({PYTHON_NAME})")
@@ -0,0 +1,188 @@
+#
+# ファイル名: m03_gemini_stream.py
+# 役割: Gemini の応答をストリーミングで受け取り、届いた分から出力ファイルに書き出す
+#
+# 応答全体を待たずに受け取り始めるため、長い文字起こしでも最初の文字が届くまでの時間が短くなる。
+# 応答オブジェクトは受け取ったチャンクごとに捨て、テキストだけを残す。
+# 最後のチャンクの finish_reason で、max_output_tokens に達して途中で切れた応答を検出する。
+# STREAM_IDLE_TIMEOUT 秒の間チャンクが届かない場合は、止まった応答として打ち切る（再試行は呼び出し側で行う）。
+#
+# 途中で切れた応答は、最初からやり直さずに、出力済みの末尾を文脈として送って続きだけを求め、重複を除いてつなげる。
+#
+
+import os
+import time
+import asyncio
+import logging
+from google.genai import types
+import m03_retry_policy
+
+PYTHON_NAME = os.path.basename(__file__)
+
+# False のとき、従来どおり応答全体を1回で受け取る
+STREAM_GENERATION = True
+# 最初のチャンク、または次のチャンクが届くまで待つ最大の秒数
+STREAM_IDLE_TIMEOUT = 120
+# 受け取り途中の応答を書き出すファイルの拡張子（出力ファイル名の後ろに付ける）
+PARTIAL_SUFFIX = '.part'
+# 途中で切れた応答の続きを求める最大の回数（0 で続きを求めない）
+MAX_CONTINUATIONS = 3
+# 続きを求めるときに、文脈として送る出力済みの末尾の文字数
+CONTINUATION_CONTEXT_CHARS = 2000
+# 続きの先頭と出力済みの末尾の重複を探す文字数の範囲（短すぎる一致は偶然とみなして除かない）
+CONTINUATION_MIN_OVERLAP = 8
+CONTINUATION_MAX_OVERLAP = 500
+# 続きを求めるときに送る指示
+CONTINUATION_PROMPT = (
+    "直前の出力は、出力できる長さの上限に達したため途中で切れています。"
+    "切れた位置の直後から、同じ形式で続きだけを出力してください。"
+    "既に出力した部分を繰り返したり、前置きや説明を加えたりしないでください。"
+)
+
+
+class StreamStalledError(TimeoutError):
+    """ストリーミングの応答が STREAM_IDLE_TIMEOUT 秒以上届かなかった"""
+
+
+def is_truncated(finish_reason):
+    """応答が max_output_tokens に達して途中で切れている場合は True を返す"""
+    return finish_reason == types.FinishReason.MAX_TOKENS
+
+
+def _finish_reason(response):
+    candidates = getattr(response, 'candidates', None)
+    if candidates:
+        return candidates[0].finish_reason
+    return None
+
+
+async def generate_text(client, model_name, contents, config, output_path=None, label="", append=False):
+    """
+    client（client.aio）で contents の応答を生成し、(テキスト, finish_reason) を返す。
+    output_path を渡すと、受け取ったテキストを届いた順に {output_path}.part に書き出す（途中で切れずに完了したら削除する）。
+    append が True の場合は、{output_path}.part に追記する。
+    label はログに表示する名前（分割ファイルのパスなど）。
+    """
+    start_time = time.time()
+    if not STREAM_GENERATION:
+        response = await client.models.generate_content(model=model_name, contents=contents, config=config)
+        finish_reason = _finish_reason(response)
+        logging.debug(response)
+        _log_finish(label, finish_reason, response, start_time)
+        return response.text, finish_reason
+
+    partial_path = f"{output_path}{PARTIAL_SUFFIX}" if output_path else None
+    partial_file = open(partial_path, 'a' if append else 'w', encoding='utf-8') if partial_path else None
+    texts = []
+    finish_reason = None
+    last_chunk = None
+    first_chunk_time = None
+    try:
+        stream = await client.models.generate_content_stream(model=model_name, contents=contents, config=config)
+        iterator = stream.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(iterator.__anext__(), STREAM_IDLE_TIMEOUT)
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                raise StreamStalledError(
+                    f"{STREAM_IDLE_TIMEOUT}秒以上応答が届かないため打ち切りました（受信済み: {sum(map(len, texts))}文字）"
+                )
+            if first_chunk_time is None:
+                first_chunk_time = time.time()
+                logging.info(f"[{label}] 最初の応答まで {first_chunk_time - start_time:.2f}秒 : ({PYTHON_NAME})")
+            last_chunk = chunk
+            finish_reason = _finish_reason(chunk) or finish_reason
+            # chunk.text は思考の要約（thought）を含まない
+            text = chunk.text
+            if text:
+                texts.append(text)
+                if partial_file:
+                    partial_file.write(text)
+                    partial_file.flush()
+    finally:
+        if partial_file:
+            partial_file.close()
+
+    _log_finish(label, finish_reason, last_chunk, start_time)
+    if partial_path and os.path.exists(partial_path) and not is_truncated(finish_reason):
+        os.remove(partial_path)
+    return "".join(texts), finish_reason
+
+
+def _rewrite_partial(output_path, text):
+    """{output_path}.part を、つなげ終えたテキストだけの内容に書き直す"""
+    if output_path:
+        with open(f"{output_path}{PARTIAL_SUFFIX}", 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+def stitch(text, continuation):
+    """続き continuation の先頭が、出力済みの text の末尾と重複していれば、重複を除いてつなげる"""
+    stripped = continuation.lstrip()
+    longest = min(len(text), len(stripped), CONTINUATION_MAX_OVERLAP)
+    for size in range(longest, CONTINUATION_MIN_OVERLAP - 1, -1):
+        if text.endswith(stripped[:size]):
+            return text + stripped[size:]
+    return text + continuation
+
+
+async def generate_complete_text(client, model_name, contents, config, output_path=None, label=""):
+    """
+    generate_text で応答を生成し、max_output_tokens に達して途中で切れていれば、
+    最大 MAX_CONTINUATIONS 回まで続きを求めてつなげる。(テキスト, 最後の finish_reason) を返す。
+
+    続きを求めるリクエストには、元の contents・出力済みの末尾（CONTINUATION_CONTEXT_CHARS 文字）・CONTINUATION_PROMPT を送る。
+    続きのリクエストが失敗した場合は m03_retry_policy の待ち時間で続きだけを再試行し、
+    再試行しても成功しない（APIキーの切り替えが必要な）エラーは呼び出し側に送出する。
+    {output_path}.part は、続きを受け取るたびに重複を除いてつなげた内容に書き直し、
+    失敗した続きの途中までの出力は再試行の前に取り除く。
+    """
+    text, finish_reason = await generate_text(client, model_name, contents, config, output_path, label)
+    continuations = 0
+    error_attempts = {}  # エラーの種類 -> 回数
+    while text and is_truncated(finish_reason) and continuations < MAX_CONTINUATIONS:
+        logging.info(f"[{label}] 途中で切れた応答（{len(text)}文字）の続きを求めます"
+                     f"（{continuations + 1}/{MAX_CONTINUATIONS}回目） : ({PYTHON_NAME})")
+        follow_up = list(contents) + [
+            types.Content(role='model', parts=[types.Part(text=text[-CONTINUATION_CONTEXT_CHARS:])]),
+            CONTINUATION_PROMPT,
+        ]
+        try:
+            continuation, finish_reason = await generate_text(
+                client, model_name, follow_up, config, output_path, label, append=True
+            )
+        except Exception as e:
+            error_class = m03_retry_policy.classify_error(e)
+            error_attempts[error_class] = error_attempts.get(error_class, 0) + 1
+            delay = m03_retry_policy.retry_delay(error_class, error_attempts[error_class], e)
+            # 失敗した続きの途中までの出力を .part から取り除く（再試行では続きを最初から受け取り直す）
+            _rewrite_partial(output_path, text)
+            if delay is None or m03_retry_policy.RETRY_POLICIES[error_class]["switch_key"]:
+                raise
+            logging.error(f"[{label}] 続きの生成中にエラーが発生しました（{error_class}）: {e}。"
+                          f"{delay:.1f}秒後に続きだけを再試行します : ({PYTHON_NAME})")
+            await asyncio.sleep(delay)
+            continue
+        continuations += 1
+        if not continuation:
+            break
+        text = stitch(text, continuation)
+        if is_truncated(finish_reason):
+            _rewrite_partial(output_path, text)
+
+    if is_truncated(finish_reason):
+        logging.warning(f"[{label}] {continuations}回続きを求めましたが、応答が途中で切れたままです : ({PYTHON_NAME})")
+    if output_path and os.path.exists(f"{output_path}{PARTIAL_SUFFIX}"):
+        os.remove(f"{output_path}{PARTIAL_SUFFIX}")
+    return text, finish_reason
+
+
+def _log_finish(label, finish_reason, response, start_time):
+    usage = getattr(response, 'usage_metadata', None)
+    output_tokens = getattr(usage, 'candidates_token_count', None)
+    logging.info(f"[{label}] 応答を受信しました（{time.time() - start_time:.2f}秒、finish_reason: {finish_reason}、"
+                 f"出力トークン数: {output_tokens}） : ({PYTHON_NAME})")
+    if is_truncated(finish_reason):
+        logging.warning(f"[{label}] 出力が max_output_tokens に達したため、応答が途中で切れています : ({PYTHON_NAME})")
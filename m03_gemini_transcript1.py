@@ -13,6 +13,10 @@ import logging  # ログ記録用のライブラリを追加
 import glob
 import asyncio
 from m03_api_key_manager import api_key_manager
+import m03_gemini_client
+import m03_gemini_stream
+import m03_retry_policy
+import m03_transcript_cache
 
 PYTHON_NAME = os.path.basename(__file__)
 
@@ -20,9 +24,37 @@ PYTHON_NAME = os.path.basename(__file__)
 # ▼▼▼ ここからが新しい設定項目 ▼▼▼
 # ----------------------------------------------------------------
 
-# Gemini APIへの最大同時リクエスト数（並列実行数）
+# Gemini APIへの同時リクエスト数（並列実行数）の初期値。ADAPTIVE_CONCURRENCY が False の場合は固定値として使う
 MAX_CONCURRENT_REQUESTS = 1
 
+# True のとき、応答時間とエラーの状況を見ながら並列数を自動で増減する
+ADAPTIVE_CONCURRENCY = True
+# 自動調整で増やす並列数の上限
+MAX_CONCURRENT_REQUESTS_LIMIT = 8
+# 応答時間（音声1MBあたりの秒数）が、これまでの最良値のこの倍率以内であれば並列数を増やす
+LATENCY_TOLERANCE = 1.5
+# 直近のリクエストのエラー率がこの値以下であれば並列数を増やす
+ERROR_RATE_THRESHOLD = 0.1
+# 429（RESOURCE_EXHAUSTED）やタイムアウトの際に、並列数に掛ける倍率
+CONCURRENCY_DECREASE_FACTOR = 0.5
+# 並列数を減らした後、この秒数の間は続けて減らさない（減らす前に送ったリクエストのエラーで減らし過ぎないため）
+CONCURRENCY_DECREASE_COOLDOWN = 30
+
+# 音声ファイルを同時にアップロードする数。文字起こし（生成）の並列数とは別に制限する
+MAX_CONCURRENT_UPLOADS = 4
+# アップロードが済み、文字起こしを待っているファイルの最大数。
+# 文字起こしが追いつかない間にアップロードだけが先に進み過ぎないよう、これを超えるとアップロードを待たせる
+UPLOADED_QUEUE_SIZE = 8
+# このサイズ（バイト）以下の音声は Files API でアップロードせず、リクエストに直接埋め込む（0 で常にアップロードする）。
+# アップロード・処理完了・削除の往復が無くなる。リクエスト全体の上限（20MB、base64 で約4/3倍になる）に収まる大きさにする
+INLINE_AUDIO_MAX_BYTES = 10 * 1024 * 1024
+# リクエストに埋め込む音声の MIME タイプ（拡張子ごと）。ここに無い形式は常にアップロードする
+INLINE_AUDIO_MIME_TYPES = {'.m4a': 'audio/mp4', '.ogg': 'audio/ogg'}
+
+# 文字起こしの対象にする音声ファイルのパターン（split_m4a フォルダ内）。
+# 入力が音声ファイルの場合は元のファイルも split_m4a にコピーされるため、分割ファイルだけを対象にする
+AUDIO_EXTRACTS = ("*_split*.m4a", "*_split*.ogg")
+
 # ----------------------------------------------------------------
 # ▲▲▲ ここまでが新しい設定項目 ▲▲▲
 # ----------------------------------------------------------------
@@ -101,89 +133,309 @@ def download_audio(url, arg1,title):
 
 logging.info(f"model_name: {MODEL_NAME}")
 
-def gemini_transcribe(api_key, audio_file_path, 
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Gemini API への同時リクエスト数を、応答の状況に合わせて増減するリミッター。
+
+    - 最初の 429 やタイムアウトまでは、成功するたびに並列数を1つ増やす（1往復ごとにほぼ倍になる）
+    - それ以降は、並列数と同じ件数のリクエストが成功するたびに1つ増やす
+    - 応答時間が最良値の LATENCY_TOLERANCE 倍を超えている間や、エラー率が ERROR_RATE_THRESHOLD を超えている間は増やさない
+    - 429 やタイムアウトが起きたら CONCURRENCY_DECREASE_FACTOR 倍に減らす
+    """
+
+    def __init__(self, initial, maximum, minimum=1):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = max(minimum, min(initial, self.maximum))
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+        self._slow_start = True
+        self._successes = 0
+        self._errors = 0
+        self._latency = None
+        self._best_latency = None
+        self._last_decrease = 0.0
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def pause(self, seconds):
+        """再試行を待つ間は枠を返し、その間は他の分割ファイルの文字起こしに枠を使わせる"""
+        await self.release()
+        await asyncio.sleep(seconds)
+        await self.acquire()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.release()
+
+    async def _set_limit(self, limit, reason):
+        limit = max(self.minimum, min(limit, self.maximum))
+        self._successes = 0
+        self._errors = 0
+        if limit == self.limit:
+            return
+        logging.info(f"並列数を {self.limit} -> {limit} に変更しました（{reason}） : ({PYTHON_NAME})")
+        async with self._condition:
+            self.limit = limit
+            self._condition.notify_all()
+
+    async def record_success(self, elapsed, size):
+        """
+        成功したリクエストの所要時間を記録し、状況が良ければ並列数を増やす。
+        長さの違う分割ファイルを同じ基準で比べるため、応答時間は音声1MBあたりの秒数で比べる。
+        """
+        latency = elapsed / max(size / (1024 * 1024), 0.01)
+        self._latency = latency if self._latency is None else 0.7 * self._latency + 0.3 * latency
+        self._best_latency = self._latency if self._best_latency is None else min(self._best_latency, self._latency)
+        self._successes += 1
+
+        if self._latency > self._best_latency * LATENCY_TOLERANCE:
+            return
+        if self._errors > (self._successes + self._errors) * ERROR_RATE_THRESHOLD:
+            return
+        if self._slow_start or self._successes >= self.limit:
+            await self._set_limit(
+                self.limit + 1,
+                f"応答時間 {self._latency:.1f}秒/MB（最良 {self._best_latency:.1f}秒/MB）、エラーなし",
+            )
+
+    async def record_error(self, error, error_class=None):
+        """
+        失敗したリクエストを記録し、リクエストが多過ぎることを示すエラー
+        （m03_retry_policy の "quota"（429）と、"server" のうちタイムアウト）であれば並列数を減らす。
+        """
+        self._errors += 1
+        if error_class is None:
+            error_class = m03_retry_policy.classify_error(error)
+        if not (error_class == "quota" or error_class == "server" and m03_retry_policy.is_timeout(error)):
+            return
+        self._slow_start = False
+        if time.time() - self._last_decrease < CONCURRENCY_DECREASE_COOLDOWN:
+            return
+        self._last_decrease = time.time()
+        await self._set_limit(
+            int(self.limit * CONCURRENCY_DECREASE_FACTOR),
+            f"{type(error).__name__}: {str(error)[:80]}",
+        )
+
+
+class MeasuredQueue(asyncio.Queue):
+    """
+    入れてから取り出すまでの待ち時間と、待ち行列の最大の長さを記録する asyncio.Queue。
+    終了の合図の None は集計しない。
+    """
+
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self.count = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+        self.max_depth = 0
+
+    def _put(self, item):
+        super()._put((item, time.time()))
+        if item is not None:
+            self.max_depth = max(self.max_depth, self.qsize())
+
+    def _get(self):
+        item, queued_at = super()._get()
+        if item is not None:
+            self.last_wait = time.time() - queued_at
+            self.count += 1
+            self.total_wait += self.last_wait
+            self.max_wait = max(self.max_wait, self.last_wait)
+        return item
+
+    def summary(self):
+        average = self.total_wait / self.count if self.count else 0.0
+        return f"{self.count}件、平均待ち時間 {average:.1f}秒、最大待ち時間 {self.max_wait:.1f}秒、最大待ち行列 {self.max_depth}件"
+
+
+
+async def gemini_transcribe(api_key, audio_file_path, 
         model_name=MODEL_NAME,
         max_retries=10, 
-        retry_delay=10, 
-        timeout=180000
+        limiter=None
         ):
-    """Gemini API を使用して音声ファイルを文字起こしする。"""
-    client = genai.Client(api_key=api_key)
+    """
+    Gemini API を使用して音声ファイルを文字起こしする（upload_with_retry と generate_transcript を続けて実行する）。
+    APIキーごとに使い回すクライアント（m03_gemini_client）の非同期インターフェースで呼び出す。
+    応答が止まった場合の打ち切りは m03_gemini_stream.STREAM_IDLE_TIMEOUT で行う。
+    limiter（AdaptiveConcurrencyLimiter）を渡すと、各リクエストの成否と所要時間を記録する。
+    """
+    cached = cached_transcript(audio_file_path, model_name)
+    if cached is not None:
+        return [cached]
+    uploaded = await upload_with_retry(api_key, audio_file_path, max_retries)
+    if uploaded is None:
+        return None
+    api_key, audio_file = uploaded
+    return await generate_transcript(api_key, audio_file_path, audio_file, model_name, max_retries, limiter)
+
+
+def inline_mime_type(audio_file_path):
+    """リクエストに埋め込む音声であれば MIME タイプを返し、アップロードする音声であれば None を返す"""
+    mime_type = INLINE_AUDIO_MIME_TYPES.get(os.path.splitext(audio_file_path)[1].lower())
+    if mime_type and os.path.getsize(audio_file_path) <= INLINE_AUDIO_MAX_BYTES:
+        return mime_type
+    return None
+
+
+async def _upload_once(api_key, audio_file_path):
+    """
+    音声ファイルを Gemini に1回だけアップロードし、ファイルの情報を返す。失敗した場合は例外を送出する。
+    INLINE_AUDIO_MAX_BYTES 以下の音声はアップロードせず、リクエストに埋め込む types.Part を返す。
+    """
+    client = m03_gemini_client.get_client(api_key)
+    mime_type = inline_mime_type(audio_file_path)
+    if mime_type:
+        logging.info(f"[{audio_file_path}] 音声をリクエストに埋め込みます（アップロードしません） : ({PYTHON_NAME})")
+        with open(audio_file_path, 'rb') as f:
+            return types.Part.from_bytes(data=f.read(), mime_type=mime_type)
+
     logging.info(f"[{audio_file_path}] Upload to Gemini: ({PYTHON_NAME})")
-    start_time = time.time()
-    
-    audio_file = None  # audio_file を初期化
-    # 音声ファイルをアップロード
+    # 新しいSDKのファイルアップロードメソッドを使用
+    return await client.files.upload(file=pathlib.Path(audio_file_path))
+
+
+async def upload_audio(api_key, audio_file_path):
+    """
+    音声ファイルを Gemini に1回だけアップロードし、ファイルの情報を返す。失敗した場合は None を返す。
+    アップロードしたファイルは、同じ APIキーの generate_transcript でしか使えない。
+    失敗してもローカルの音声ファイルは削除しない（再試行や --resume で使うため）。
+    """
     try:
-        # 新しいSDKのファイルアップロードメソッドを使用
-        audio_file = client.files.upload(file=pathlib.Path(audio_file_path))
+        return await _upload_once(api_key, audio_file_path)
     except Exception as e:
-        logging.error(f"ファイルのアップロード中にエラーが発生しました: {e} : ({PYTHON_NAME})")
-        # アップロードに失敗したファイルを削除
-        if os.path.exists(audio_file_path):
-            os.remove(audio_file_path)
-            logging.info(f"アップロードに失敗したファイルを削除しました: {audio_file_path}")
+        logging.error(f"[{audio_file_path}] ファイルのアップロード中にエラーが発生しました: {e} : ({PYTHON_NAME})")
+        return None
+
+
+async def upload_with_retry(api_key, audio_file_path, max_retries=10):
+    """
+    音声ファイルを Gemini にアップロードし、(アップロードに使った APIキー, ファイルの情報) を返す。
+    失敗した場合は m03_retry_policy でエラーを分類し、種類ごとの待ち時間と回数で再試行する。
+    429（割り当て量の超過）の場合は、別の APIキーに切り替えて再試行する。
+    再試行しても成功しない場合は None を返す（ローカルの音声ファイルは削除しない）。
+    """
+    if not os.path.exists(audio_file_path):
+        logging.error(f"[{audio_file_path}] 音声ファイルが見つからないため、アップロードできません : ({PYTHON_NAME})")
         return None
+    error_attempts = {}  # エラーの種類 -> 回数
+    for attempt in range(max_retries):
+        try:
+            return api_key, await _upload_once(api_key, audio_file_path)
+        except Exception as e:
+            error_class = m03_retry_policy.classify_error(e)
+            error_attempts[error_class] = error_attempts.get(error_class, 0) + 1
+            logging.error(f"[{audio_file_path}] ファイルのアップロード中にエラーが発生しました（{error_class}）: {e}"
+                          f"(試行回数: {attempt + 1}) : ({PYTHON_NAME})")
+            delay = m03_retry_policy.retry_delay(error_class, error_attempts[error_class], e)
+            if delay is None or attempt == max_retries - 1:
+                logging.error(f"[{audio_file_path}] 最大試行回数に達したか、再試行しても成功しないエラーのため、"
+                              f"アップロードを中止します。 : ({PYTHON_NAME})")
+                return None
+
+            if m03_retry_policy.RETRY_POLICIES[error_class]["switch_key"]:
+                api_key_manager.report_quota_error(api_key, delay)
+                new_key = await api_key_manager.get_next_key()
+                if new_key:
+                    api_key = new_key
+                    # 切り替えたキーが休ませているキーでなければ、待たずに再試行する
+                    delay = api_key_manager.cooldown_remaining(api_key)
+
+            logging.info(f"[{audio_file_path}] {delay:.1f}秒後にアップロードを再試行します"
+                         f"（{error_class}: {error_attempts[error_class]}回目） : ({PYTHON_NAME})")
+            await asyncio.sleep(delay)
+    return None
+
+
+async def generate_transcript(api_key, audio_file_path, audio_file,
+        model_name=MODEL_NAME,
+        max_retries=10,
+        limiter=None
+        ):
+    """
+    upload_audio でアップロードしたファイル audio_file を文字起こしし、[文字起こし結果] を返す。
+    終わったら Gemini 上のファイルを削除する。失敗した場合は None を返す。
+
+    失敗した場合は m03_retry_policy でエラーを分類し、種類ごとの待ち時間と回数で再試行する。
+    429（割り当て量の超過）の場合は、別の APIキーでアップロードし直してから再試行する。
+    """
+    client = m03_gemini_client.get_client(api_key)
+    start_time = time.time()
 
     # 文字起こしをリクエスト
-    import m03_gemini_prompt1
-    prompt0 = m03_gemini_prompt1.main()
+    prompt0, config = transcription_request()
 
-    response0 = None
     text0 = None # text0を初期化
+    output_path = os.path.splitext(audio_file_path)[0] + "_0.txt"
+    error_attempts = {}  # エラーの種類 -> 回数
     for attempt in range(max_retries): # 最大再試行回数まで繰り返す
         try:
             logging.info(f"[{audio_file_path}] 文字起こし　試行 {attempt + 1} 回目 : ({PYTHON_NAME})")
-            # 新しいSDKの非ストリーミングメソッドを使用
-            response0 = client.models.generate_content(
-                            model=model_name,
-                            contents=[prompt0, audio_file],
-                            config=types.GenerateContentConfig(
-                                max_output_tokens=50000, #50000000,
-                                temperature=0.1,
-                                #thinking_config=types.ThinkingConfig(thinking_budget=0),
-                            ),
-                        )
+            # ストリーミングで受け取り、届いた分から {分割ファイル名}_0.txt.part に書き出す
+            # 応答が途中で切れた場合は、最初からやり直さずに続きだけを求めてつなげる
+            request_time = time.time()
+            text, finish_reason = await m03_gemini_stream.generate_complete_text(
+                client, model_name, [prompt0, audio_file], config, output_path, audio_file_path
+            )
+
+            # テキストが空の場合に再試行する
+            if not text:
+                logging.error(f"[{audio_file_path}] 応答にテキストがありません（finish_reason: {finish_reason}） : ({PYTHON_NAME})")
+                raise m03_retry_policy.EmptyResponseError("Gemini APIからの応答が空です。")
             
-            # 非ストリーミングでは、レスポンスから直接textを取得
-            # response0.textが存在しない場合や空の場合に再試行する
-            if not response0 or not response0.text:
-                logging.error(response0)
-                logging.error('response0')
-                logging.error(f"エラー: [{audio_file_path}] Gemini APIからの応答が空です。(試行回数: {attempt + 1}) : ({PYTHON_NAME})")
-                if attempt == max_retries - 1:
-                    logging.error(f"[{audio_file_path}] 最大試行回数に達しました。文字起こしを中止します。 : ({PYTHON_NAME})")
-                    return None
-                time.sleep(retry_delay)
-                continue
-            
-            text0 = response0.text
-
-            for part in response0.candidates[0].content.parts:
-                if not part.text:
-                    continue
-                if part.thought:
-                    print(part.text)
-                    print("Thought summary:")
-                    print()
-                else:
-                    print(part.text)
-                    print("Answer:")
-                    print()
-
-            logging.info(response0)
-            logging.info('response0')
+            text0 = text
+            if limiter:
+                await limiter.record_success(time.time() - request_time, os.path.getsize(audio_file_path))
 
             break # 正常に処理が完了した場合もループを抜ける
                 
         except Exception as e:
-            logging.error(f"[{audio_file_path}] 文字起こし中にエラーが発生しました: {e}(試行回数: {attempt + 1}) : ({PYTHON_NAME})")
-            if attempt == max_retries - 1:
-                logging.error(f"[{audio_file_path}] 最大試行回数に達しました。文字起こしを中止します。 : ({PYTHON_NAME})")
-                return None
-            time.sleep(retry_delay)  # 指定秒数だけ待機
+            error_class = m03_retry_policy.classify_error(e)
+            error_attempts[error_class] = error_attempts.get(error_class, 0) + 1
+            logging.error(f"[{audio_file_path}] 文字起こし中にエラーが発生しました（{error_class}）: {e}(試行回数: {attempt + 1}) : ({PYTHON_NAME})")
+            if limiter:
+                await limiter.record_error(e, error_class)
+            delay = m03_retry_policy.retry_delay(error_class, error_attempts[error_class], e)
+            if delay is None or attempt == max_retries - 1:
+                logging.error(f"[{audio_file_path}] 最大試行回数に達したか、再試行しても成功しないエラーのため、文字起こしを中止します。 : ({PYTHON_NAME})")
+                break
+
+            if m03_retry_policy.RETRY_POLICIES[error_class]["switch_key"]:
+                api_key_manager.report_quota_error(api_key, delay)
+                switched = await switch_api_key(api_key, audio_file_path, audio_file)
+                if switched:
+                    api_key, audio_file = switched
+                    client = m03_gemini_client.get_client(api_key)
+                    # 切り替えたキーが休ませているキーでなければ、待たずに再試行する
+                    delay = api_key_manager.cooldown_remaining(api_key)
+
+            logging.info(f"[{audio_file_path}] {delay:.1f}秒後に再試行します（{error_class}: {error_attempts[error_class]}回目） : ({PYTHON_NAME})")
+            # 待っている間は並列実行の枠を返し、他の分割ファイルの文字起こしを進める
+            if limiter:
+                await limiter.pause(delay)
+            else:
+                await asyncio.sleep(delay)
             continue
 
+    # アップロードしたファイルを削除 (元のロジックにはなかったが、追加を推奨)
+    await delete_uploaded(client, audio_file)
+
     if text0 is None:
         logging.error(f"[{audio_file_path}] 文字起こしに失敗しました: prompt1 : ({PYTHON_NAME})")
         return None
@@ -192,17 +444,67 @@ def gemini_transcribe(api_key, audio_file_path,
     elapsed_time = end_time - start_time  # 経過時間を計算
     logging.info(f"[{audio_file_path}] gemini関数の実行時間: {elapsed_time:.2f}秒 : ({PYTHON_NAME})")
 
-    # アップロードしたファイルを削除 (元のロジックにはなかったが、追加を推奨)
-    if audio_file:
-        try:
-            client.files.delete(name=audio_file.name)
-            logging.info(f"Gemini上のファイル {audio_file.name} を削除しました。")
-        except Exception as e:
-            logging.warning(f"Gemini上のファイル {audio_file.name} の削除に失敗しました: {e}")
-
+    m03_transcript_cache.put(transcript_cache_key(audio_file_path, model_name), text0)
     return [text0]
 
 
+def transcription_request():
+    """文字起こしに使うプロンプトと生成設定を返す"""
+    import m03_gemini_prompt1
+    config = types.GenerateContentConfig(
+        max_output_tokens=50000, #50000000,
+        temperature=0.1,
+        #thinking_config=types.ThinkingConfig(thinking_budget=0),
+    )
+    return m03_gemini_prompt1.main(), config
+
+
+def transcript_cache_key(audio_file_path, model_name=MODEL_NAME):
+    """音声の内容・プロンプト・モデル名・生成設定から、文字起こし結果のキャッシュのキーを返す"""
+    prompt0, config = transcription_request()
+    return m03_transcript_cache.make_key(
+        "transcribe", [m03_transcript_cache.file_sha256(audio_file_path), prompt0], model_name, config
+    )
+
+
+def cached_transcript(audio_file_path, model_name=MODEL_NAME):
+    """同じ音声・プロンプト・モデル・生成設定で文字起こし済みであれば、その結果を返す。無い場合は None を返す"""
+    if not m03_transcript_cache.TRANSCRIPT_CACHE or not os.path.exists(audio_file_path):
+        return None
+    text = m03_transcript_cache.get(transcript_cache_key(audio_file_path, model_name))
+    if text is not None:
+        logging.info(f"[{audio_file_path}] キャッシュした文字起こし結果を使います : ({PYTHON_NAME})")
+    return text
+
+
+async def delete_uploaded(client, audio_file):
+    """Gemini 上にアップロードしたファイルを削除する（リクエストに埋め込んだ音声の場合は何もしない）"""
+    if not audio_file or isinstance(audio_file, types.Part):
+        return
+    try:
+        await client.files.delete(name=audio_file.name)
+        logging.info(f"Gemini上のファイル {audio_file.name} を削除しました。")
+    except Exception as e:
+        logging.warning(f"Gemini上のファイル {audio_file.name} の削除に失敗しました: {e}")
+
+
+async def switch_api_key(api_key, audio_file_path, audio_file):
+    """
+    別の APIキーに切り替え、そのキーで音声ファイルをアップロードし直す。
+    アップロードしたファイルは、アップロードしたキーでしか使えないため。
+    切り替えられた場合は (新しいキー, 新しくアップロードしたファイル) を返し、それ以外は None を返す。
+    """
+    new_key = await api_key_manager.get_next_key()
+    if not new_key or new_key == api_key:
+        return None
+    new_file = await upload_audio(new_key, audio_file_path)
+    if new_file is None:
+        return None
+    await delete_uploaded(m03_gemini_client.get_client(api_key), audio_file)
+    logging.info(f"[{audio_file_path}] APIキーを {api_key[-4:]} から {new_key[-4:]} に切り替えました : ({PYTHON_NAME})")
+    return new_key, new_file
+
+
 def write_to_file(text, file_path):
     """
     文字列をファイルに書き込む。
@@ -214,67 +516,169 @@ def write_to_file(text, file_path):
     except Exception as e:
         logging.info(f"ファイル書き込み中にエラーが発生しました: {e} : ({PYTHON_NAME})")
 
-def main2(filename, api_key):
-    """1つのファイルの文字起こし処理"""
+async def main2(filename, api_key, limiter=None, audio_file=None, on_transcribed=None):
+    """
+    1つのファイルの文字起こし処理。
+    audio_file（upload_audio の戻り値）を渡した場合は、アップロードを省いて文字起こしだけを行う。
+    """
     audio_file_path = filename
     if audio_file_path:
-        transcriptions = gemini_transcribe(api_key, audio_file_path)
-        result=[]
-        if transcriptions:
-            for i,transcription in enumerate(transcriptions): 
-                if transcription:                
-                    output_file_path = os.path.splitext(audio_file_path)[0] + "_" + str(i) + ".txt"
-                    write_to_file(transcription, output_file_path)
-                    result.append(f'文字起こし結果を {output_file_path} に保存しました。 : ({PYTHON_NAME})')
-                else:
-                    result.append(f'Geminiでの文字起こしの一部（インデックス{i}）に失敗しました。 : ({PYTHON_NAME})')
+        if audio_file is not None:
+            transcriptions = await generate_transcript(api_key, audio_file_path, audio_file, limiter=limiter)
         else:
-            result.append(f'Geminiでの文字起こしに失敗しました。 : ({PYTHON_NAME})')
-
-        logging.info(f"-----")
-        return "\n".join(result)
+            transcriptions = await gemini_transcribe(api_key, audio_file_path, limiter=limiter)
+        return save_transcriptions(audio_file_path, transcriptions, on_transcribed)
     else:
         return f'音声ファイルがありません : ({PYTHON_NAME})'
 
-async def worker(semaphore, filename, api_key_manager):
-    """セマフォを使って並列実行を制御されるワーカー関数"""
-    async with semaphore:
-        print(f"[{os.path.basename(filename)}] 処理開始... (現在の並列実行数: {MAX_CONCURRENT_REQUESTS - semaphore._value}/{MAX_CONCURRENT_REQUESTS})")
-        
+def save_transcriptions(audio_file_path, transcriptions, on_transcribed=None):
+    """
+    文字起こし結果を {分割ファイル名}_{インデックス}.txt に保存し、結果のメッセージを返す。
+    全ての結果を保存できた場合は、on_transcribed(分割ファイルのパス) を呼ぶ。
+    """
+    result=[]
+    if transcriptions:
+        for i,transcription in enumerate(transcriptions): 
+            if transcription:                
+                output_file_path = os.path.splitext(audio_file_path)[0] + "_" + str(i) + ".txt"
+                write_to_file(transcription, output_file_path)
+                result.append(f'文字起こし結果を {output_file_path} に保存しました。 : ({PYTHON_NAME})')
+            else:
+                result.append(f'Geminiでの文字起こしの一部（インデックス{i}）に失敗しました。 : ({PYTHON_NAME})')
+    else:
+        result.append(f'Geminiでの文字起こしに失敗しました。 : ({PYTHON_NAME})')
+
+    if on_transcribed and transcriptions and all(transcriptions):
+        on_transcribed(audio_file_path)
+    logging.info(f"-----")
+    return "\n".join(result)
+
+async def upload_worker(queue, uploaded, api_key_manager, results, on_transcribed=None):
+    """
+    アップロードを担当するワーカー関数。MAX_CONCURRENT_UPLOADS 個を同時に動かす。
+    queue から分割ファイルを受け取ってアップロードし、(ファイル名, APIキー, アップロードしたファイル) を uploaded に入れる。
+    """
+    while True:
+        filename = await queue.get()
+        if filename is None:
+            # 他のアップロード担当にも終了を伝える
+            queue.put_nowait(None)
+            return
+        # 前回の実行などで同じ音声を文字起こし済みであれば、アップロードも文字起こしもしない
+        cached = cached_transcript(filename)
+        if cached is not None:
+            results.append(save_transcriptions(filename, [cached], on_transcribed))
+            continue
+
+        print(f"[{os.path.basename(filename)}] アップロード開始... "
+              f"(アップロード待ち: {queue.qsize()}件、待ち時間: {getattr(queue, 'last_wait', 0.0):.1f}秒)")
+
         api_key = await api_key_manager.get_next_key()
         if not api_key:
             logging.error(f"APIキーが枯渇しました。{filename}の処理をスキップします。")
-            return f"APIキー枯渇のため {filename} をスキップ"
+            results.append(f"APIキー枯渇のため {filename} をスキップ")
+            continue
+        # 一時的なエラーは再試行し、429 の場合は別の APIキーでアップロードし直す
+        result = await upload_with_retry(api_key, filename)
+        if result is None:
+            results.append(f'Geminiでの文字起こしに失敗しました（アップロード失敗）: {filename} : ({PYTHON_NAME})')
+            continue
+        api_key, audio_file = result
+        await uploaded.put((filename, api_key, audio_file))
 
-        result = await asyncio.to_thread(main2, filename, api_key)
-        
+async def generate_worker(limiter, uploaded, filename, api_key, audio_file, on_transcribed=None):
+    """文字起こし（生成）を担当するワーカー関数。limiter の枠を取得済みの状態で呼ばれ、終わったら枠を返す"""
+    try:
+        print(f"[{os.path.basename(filename)}] 文字起こし開始... (現在の並列実行数: {limiter.in_flight}/{limiter.limit}、"
+              f"文字起こし待ち: {uploaded.qsize()}件、待ち時間: {uploaded.last_wait:.1f}秒)")
+        result = await main2(filename, api_key, limiter, audio_file, on_transcribed)
         print(f"[{os.path.basename(filename)}] 処理完了。")
         return result
+    finally:
+        await limiter.release()
 
-async def main():
-    directory = "./split_m4a/"
-    extract = "*.m4a"
-    m4a_files = get_m4a_file_names(directory,extract)
+async def main(directory="./split_m4a/"):
+    """
+    directory（ジョブの作業ディレクトリの split_m4a）の分割ファイルを文字起こしし、
+    結合したテキスト z1_combined.txt のパスを返す。
+    """
+    # m02_ffmpeg の音声プロファイルによって、分割ファイルは .m4a（AAC）または .ogg（Opus）になる
+    m4a_files = sorted(
+        file_name for extract in AUDIO_EXTRACTS for file_name in get_m4a_file_names(directory, extract)
+    )
     if not m4a_files:
         logging.info(f"{directory} に対象ファイルが見つかりません。")
         return None
-    
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
-    
-    tasks = []
+
+    queue = MeasuredQueue()
     for filename in m4a_files:
-        task = asyncio.create_task(worker(semaphore, filename, api_key_manager))
-        tasks.append(task)
+        queue.put_nowait(filename)
+    queue.put_nowait(None)
+    return await main_queue(queue, directory)
 
-    print(f"\n--- {len(tasks)}個のファイルを最大{MAX_CONCURRENT_REQUESTS}の並列度で文字起こし開始 ---")
-    results = await asyncio.gather(*tasks)
-    print("\n--- 全ての並列処理が完了 ---")
+async def main_queue(queue, directory="./split_m4a/", on_transcribed=None):
+    """
+    queue から分割ファイルのパスを受け取り次第、文字起こしを始める。
+    None を受け取ったら、全ての文字起こしの完了を待ち、結合したテキスト z1_combined.txt のパスを返す。
+    m00_main_mojiokosi.py が、ffmpeg が分割ファイルを書き終えるたびに queue に入れることで、
+    音声変換と文字起こしが並行して進む。
+
+    アップロードと文字起こし（生成）は別々のワーカーで行い、それぞれの並列数を別に制限する。
+    アップロード済みのファイルは UPLOADED_QUEUE_SIZE 件まで uploaded に溜め、生成の枠が空いたものから文字起こしする。
+    on_transcribed を渡すと、分割ファイルの文字起こし結果を保存するたびに on_transcribed(分割ファイルのパス) を呼ぶ。
+    """
+    # ADAPTIVE_CONCURRENCY が False の場合は、上限を初期値と同じにして並列数を増やさない
+    maximum = MAX_CONCURRENT_REQUESTS_LIMIT if ADAPTIVE_CONCURRENCY else MAX_CONCURRENT_REQUESTS
+    limiter = AdaptiveConcurrencyLimiter(MAX_CONCURRENT_REQUESTS, maximum)
+    uploaded = MeasuredQueue(max(UPLOADED_QUEUE_SIZE, 1))
+    results = []
+
+    print(f"\n--- アップロード{MAX_CONCURRENT_UPLOADS}並列、文字起こし並列度{limiter.limit}（上限{limiter.maximum}）で開始 ---")
+    uploaders = [
+        asyncio.create_task(upload_worker(queue, uploaded, api_key_manager, results, on_transcribed))
+        for _ in range(max(MAX_CONCURRENT_UPLOADS, 1))
+    ]
+
+    async def finish_uploads():
+        try:
+            await asyncio.gather(*uploaders)
+        finally:
+            await uploaded.put(None)
+    uploads_done = asyncio.create_task(finish_uploads())
+
+    tasks = []
+    try:
+        while True:
+            # 生成の枠が空いてから、アップロード済みのファイルを取り出す
+            await limiter.acquire()
+            item = await uploaded.get()
+            if item is None:
+                await limiter.release()
+                break
+            tasks.append(asyncio.create_task(generate_worker(limiter, uploaded, *item, on_transcribed)))
+        await uploads_done
+    except BaseException:
+        for task in uploaders + tasks + [uploads_done]:
+            task.cancel()
+        raise
+
+    if not tasks and not results:
+        logging.info(f"{directory} に対象ファイルが見つかりません。")
+        return None
+    results += await asyncio.gather(*tasks)
+    print(f"\n--- 全ての並列処理が完了（最終的な並列度: {limiter.limit}） ---")
+    if isinstance(queue, MeasuredQueue):
+        print(f"アップロード待ち: {queue.summary()} : ({PYTHON_NAME})")
+    print(f"文字起こし待ち: {uploaded.summary()} : ({PYTHON_NAME})")
     
     for res in results:
         if res:
             logging.info(res)
 
-    # 後処理
+    return combine_transcripts(directory)
+
+def combine_transcripts(directory="./split_m4a/"):
+    """directory の分割ファイルの文字起こし結果（*0.txt）を結合して z1_combined.txt に保存し、そのパスを返す"""
     for i in range(0,1):
         extract = "*" + str(i) + ".txt"
         txt_files = get_m4a_file_names(directory, extract)
@@ -12,6 +12,10 @@ import logging
 import glob
 import asyncio
 from m03_api_key_manager import api_key_manager
+import m03_gemini_client
+import m03_gemini_stream
+import m03_retry_policy
+import m03_transcript_cache
 
 PYTHON_NAME = os.path.basename(__file__)
 
@@ -31,18 +35,15 @@ def write_to_file(text, file_path):
     except Exception as e:
         logging.info(f"ファイル書き込み中にエラーが発生しました: {e} : ({PYTHON_NAME})")
 
-def gemini_transcribe2(transcription, file_path, api_key, import_file_num, 
-        model_name=MODEL_NAME
+async def gemini_transcribe2(transcription, file_path, api_key, import_file_num, 
+        model_name=MODEL_NAME, output_file_path=None
         ):
     """
-    渡されたAPIキーを使ってGemini APIを1回だけ呼び出す。
-    リトライは行わない。
+    渡されたAPIキーを使ってGemini APIを呼び出す。
+    リトライは行わない（応答が途中で切れた場合に、続きを求めるリクエストだけを追加で送る）。
+    output_file_path を渡すと、受け取り途中の応答を {output_file_path}.part に書き出す。
+    同じプロンプト・モデル・生成設定の応答がキャッシュにあれば、APIを呼ばずにそれを返す。
     """
-    time.sleep(1)
-    client = genai.Client(api_key=api_key)
-    logging.info(f"[{file_path}] APIコール中 Key:{api_key[-4:]} model:{model_name}")
-    start_time = time.time()
-    
     if import_file_num == 2:
         import m03_gemini_prompt2 as prompt_module
     else:
@@ -75,41 +76,50 @@ def gemini_transcribe2(transcription, file_path, api_key, import_file_num,
         ]
     )
 
+    stage = "edit" if import_file_num == 2 else "magazine"
+    cache_key = m03_transcript_cache.make_key(stage, [prompt], model_name, generation_config)
+    cached = m03_transcript_cache.get(cache_key)
+    if cached is not None:
+        logging.info(f"[{file_path}] キャッシュした応答を使います。")
+        return cached
+
+    await asyncio.sleep(1)
+    client = m03_gemini_client.get_client(api_key)
+    logging.info(f"[{file_path}] APIコール中 Key:{api_key[-4:]} model:{model_name}")
+    start_time = time.time()
+
     try:
-        response = client.models.generate_content(
-            model=model_name,
-            contents=[prompt],
-            config=generation_config
+        text1, finish_reason = await m03_gemini_stream.generate_complete_text(
+            client, model_name, [prompt], generation_config, output_file_path, file_path
         )
 
-        
-        if response.text:
-            text1 = response.text
-            logging.info(response)
+        if text1:
             logging.info(f"[{file_path}] テキスト取得成功。")
             end_time = time.time()
             elapsed_time = end_time - start_time
             logging.info(f"[{file_path}] gemini_transcribe2の実行時間: {elapsed_time:.2f}秒")
+            m03_transcript_cache.put(cache_key, text1)
             return text1
 
-        logging.warning(f"[{file_path}] API応答からテキストを抽出できませんでした。応答内容: {response}")
-        logging.warning(f"[{file_path}] API応答からテキストを抽出できませんでした。応答内容\n")
-        raise ValueError("API応答からテキストを抽出できませんでした。")
+        logging.warning(f"[{file_path}] API応答からテキストを抽出できませんでした。finish_reason: {finish_reason}")
+        raise m03_retry_policy.EmptyResponseError("API応答からテキストを抽出できませんでした。")
 
     except Exception as e:
         logging.error(f"[{file_path}] API呼び出し中にエラーが発生しました: {e}")
         raise
 
 async def process_step(step_name, input_file_path, output_file_path, prompt_module_num, 
-    max_retries=10, 
-    retry_delay=10
+    max_retries=10
     ):
     """
     指定されたステップの処理を行う。
     リトライのたびに新しいAPIキーを取得する。
+    待ち時間と回数は、エラーの種類ごとに m03_retry_policy で決める。
     """
     logging.info(f"--- {step_name} を開始します: {input_file_path} -> {output_file_path} ---")
     
+    error_attempts = {}  # エラーの種類 -> 回数
+    api_key = None
     for attempt in range(max_retries):
         try:
             api_key = await api_key_manager.get_next_key()
@@ -122,12 +132,12 @@ async def process_step(step_name, input_file_path, output_file_path, prompt_modu
             with open(input_file_path, 'r', encoding='utf-8') as f:
                 combined_text = f.read()
 
-            transcription = await asyncio.to_thread(
-                gemini_transcribe2,
+            transcription = await gemini_transcribe2(
                 combined_text,
                 input_file_path,
                 api_key,
-                prompt_module_num
+                prompt_module_num,
+                output_file_path=output_file_path
             )
             
             if transcription:
@@ -136,18 +146,31 @@ async def process_step(step_name, input_file_path, output_file_path, prompt_modu
                 return transcription
 
         except Exception as e:
-            logging.error(f"[{input_file_path}] {step_name}でエラーが発生しました: {e} (試行回数: {attempt + 1})")
+            error_class = m03_retry_policy.classify_error(e)
+            error_attempts[error_class] = error_attempts.get(error_class, 0) + 1
+            logging.error(f"[{input_file_path}] {step_name}でエラーが発生しました（{error_class}）: {e} (試行回数: {attempt + 1})")
+            delay = m03_retry_policy.retry_delay(error_class, error_attempts[error_class], e)
+            if delay is None:
+                logging.error(f"[{input_file_path}] 再試行しても成功しないエラーのため、{step_name}を中止します。")
+                return None
+            if m03_retry_policy.RETRY_POLICIES[error_class]["switch_key"] and api_key:
+                api_key_manager.report_quota_error(api_key, delay)
+                # 次の試行では休ませていない別のキーを使うため、いずれかのキーが使えるようになるまでだけ待つ
+                delay = api_key_manager.next_available_in()
 
-        if attempt < max_retries - 1:
-            logging.info(f"{retry_delay}秒待機してAPIキーを変更し、再試行します...")
-            await asyncio.sleep(retry_delay)
+            if attempt < max_retries - 1:
+                logging.info(f"{delay:.1f}秒待機してAPIキーを変更し、再試行します...")
+                await asyncio.sleep(delay)
 
     logging.error(f"[{input_file_path}] 最大試行回数({max_retries}回)に達しました。{step_name}を中止します。")
     return None
 
-async def process_file_pipeline(input_path):
+async def process_file_pipeline(input_path, done_steps=(), on_step=None):
     """
     単一の入力ファイルに対して、編集とマガジン化のパイプライン処理を行う。
+    done_steps に含まれるステップ（"edit" / "magazine"）は、出力ファイルが有れば実行しない。
+    on_step を渡すと、ステップが完了するたびに on_step(ステップ名) を呼ぶ。
+    両方のステップが完了した場合は True を返す。
     """
     directory = os.path.dirname(input_path)
     base_name = os.path.basename(input_path)
@@ -160,45 +183,58 @@ async def process_file_pipeline(input_path):
 
     logging.info(f"--- パイプライン開始: {input_path} ---")
 
-    step1_result = await process_step(
-        step_name="日本語編集",
-        input_file_path=input_path,
-        output_file_path=output_path_z2,
-        prompt_module_num=2
-    )
+    if "edit" in done_steps and os.path.exists(output_path_z2):
+        logging.info(f"ステップ1（日本語編集）は完了済みのため、{output_path_z2} を使います。")
+    else:
+        step1_result = await process_step(
+            step_name="日本語編集",
+            input_file_path=input_path,
+            output_file_path=output_path_z2,
+            prompt_module_num=2
+        )
 
-    if not step1_result:
-        logging.error(f"ステップ1（日本語編集）に失敗したため、{input_path} の処理を中断します。")
-        return
+        if not step1_result:
+            logging.error(f"ステップ1（日本語編集）に失敗したため、{input_path} の処理を中断します。")
+            return False
+        if on_step:
+            on_step("edit")
 
-    step2_result = await process_step(
-        step_name="マガジン化",
-        input_file_path=output_path_z2,
-        output_file_path=output_path_z3,
-        prompt_module_num=3
-    )
+    if "magazine" in done_steps and os.path.exists(output_path_z3):
+        logging.info(f"ステップ2（マガジン化）は完了済みのため、{output_path_z3} を使います。")
+    else:
+        step2_result = await process_step(
+            step_name="マガジン化",
+            input_file_path=output_path_z2,
+            output_file_path=output_path_z3,
+            prompt_module_num=3
+        )
 
-    if not step2_result:
-        logging.error(f"ステップ2（マガジン化）に失敗したため、{input_path} の処理を中断します。")
-        return
+        if not step2_result:
+            logging.error(f"ステップ2（マガジン化）に失敗したため、{input_path} の処理を中断します。")
+            return False
+        if on_step:
+            on_step("magazine")
         
     logging.info(f"--- パイプライン完了: {input_path} ---")
+    return True
 
 
-async def main(combined_file_path):
+async def main(combined_file_path, done_steps=(), on_step=None):
     """
     メイン処理。引数で渡された結合済みファイルに対して処理を実行する。
+    done_steps・on_step は process_file_pipeline に渡す。編集とマガジン化が完了した場合は True を返す。
     """
     if not combined_file_path or not os.path.exists(combined_file_path):
         print("処理対象の z1_combined.txt ファイルが見つかりません。")
-        return
+        return False
 
     print(f"処理対象のファイル: ['{combined_file_path}']")
 
     # process_file_pipelineは非同期関数なので、そのままawaitで呼び出す
-    await process_file_pipeline(combined_file_path)
+    completed = await process_file_pipeline(combined_file_path, done_steps, on_step)
     
     print("すべての処理が完了しました。")
+    return completed
 
 if __name__ == "__main__":
     try:
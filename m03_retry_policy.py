@@ -0,0 +1,104 @@
+#
+# ファイル名: m03_retry_policy.py
+# 役割: Gemini API のエラーを種類ごとに分類し、再試行するかどうかと待ち時間を決める
+#
+# 待ち時間は種類ごとの上限付き指数バックオフに、ジッター（ランダムなずらし）を加えて決める。
+# 複数の分割ファイルが同時に失敗しても、一斉に再試行して再び 429 になることを避ける。
+# サーバーが待ち時間（Retry-After ヘッダーや RetryInfo の retryDelay）を返した場合は、それより短くは待たない。
+#
+
+import os
+import re
+import random
+
+PYTHON_NAME = os.path.basename(__file__)
+
+# エラーの種類ごとの再試行の設定
+#   max_attempts : この種類のエラーで試行する回数の上限（1 の場合は再試行しない）
+#   base_delay   : 1回目の再試行までの待ち時間（秒）。再試行のたびに倍になる
+#   max_delay    : 待ち時間の上限（秒）
+#   switch_key   : True の場合、再試行の前に別の APIキーに切り替える
+RETRY_POLICIES = {
+    # 429 / RESOURCE_EXHAUSTED: APIキーの割り当て量を使い切った
+    "quota": {"max_attempts": 8, "base_delay": 5, "max_delay": 120, "switch_key": True},
+    # 5xx / UNAVAILABLE / タイムアウト / 接続エラー: サーバー側の一時的な問題
+    "server": {"max_attempts": 6, "base_delay": 2, "max_delay": 60, "switch_key": False},
+    # 応答が空（安全フィルターなどで本文が返らなかった）
+    "empty": {"max_attempts": 3, "base_delay": 1, "max_delay": 10, "switch_key": False},
+    # 400 / 403 / 404: リクエストやファイルが不正で、再試行しても成功しない
+    "invalid": {"max_attempts": 1, "base_delay": 0, "max_delay": 0, "switch_key": False},
+    # 上記以外
+    "unknown": {"max_attempts": 4, "base_delay": 2, "max_delay": 30, "switch_key": False},
+}
+
+
+class EmptyResponseError(Exception):
+    """Gemini API の応答にテキストが含まれていなかった"""
+
+
+def is_timeout(error):
+    """応答が時間内に届かなかったエラー（タイムアウト・DEADLINE_EXCEEDED / 504）であれば True を返す"""
+    if isinstance(error, TimeoutError) or "Timeout" in type(error).__name__:
+        return True
+    return getattr(error, "code", None) == 504 or str(getattr(error, "status", None) or "") == "DEADLINE_EXCEEDED"
+
+
+def classify_error(error):
+    """エラーを RETRY_POLICIES のいずれかの種類に分類する"""
+    if isinstance(error, EmptyResponseError):
+        return "empty"
+    name = type(error).__name__
+    if is_timeout(error) or "Connect" in name or "RemoteProtocol" in name:
+        return "server"
+
+    code = getattr(error, "code", None)
+    status = str(getattr(error, "status", None) or "")
+    message = str(error)
+    if code == 429 or status == "RESOURCE_EXHAUSTED" or "RESOURCE_EXHAUSTED" in message:
+        return "quota"
+    if isinstance(code, int) and code >= 500 or status in ("UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED"):
+        return "server"
+    if code in (400, 403, 404) or status in ("INVALID_ARGUMENT", "PERMISSION_DENIED", "NOT_FOUND", "FAILED_PRECONDITION"):
+        return "invalid"
+    if code is None and re.match(r"^429\b", message):
+        return "quota"
+    if code is None and re.match(r"^5\d\d\b", message):
+        return "server"
+    return "unknown"
+
+
+def retry_after(error):
+    """サーバーが指定した待ち時間（秒）を返す。指定が無い場合は None を返す"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        try:
+            value = headers.get("retry-after")
+            if value:
+                return float(value)
+        except (TypeError, ValueError):
+            pass
+
+    # google.rpc.RetryInfo の retryDelay（例: "31s"）
+    details = getattr(error, "details", None)
+    match = re.search(r"""['"]retryDelay['"]\s*:\s*['"]([\d.]+)s['"]""", str(details or error))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def retry_delay(error_class, attempt, error=None):
+    """
+    error_class の種類のエラーが attempt 回目に起きた後、再試行までに待つ秒数を返す。
+    再試行しない場合（試行回数の上限に達した、再試行しても成功しない種類のエラー）は None を返す。
+    """
+    policy = RETRY_POLICIES[error_class]
+    if attempt >= policy["max_attempts"]:
+        return None
+    cap = min(policy["max_delay"], policy["base_delay"] * 2 ** (attempt - 1))
+    # 待ち時間の半分は必ず待ち、残りをランダムにずらす
+    delay = cap / 2 + random.uniform(0, cap / 2)
+    hint = retry_after(error) if error is not None else None
+    if hint is not None:
+        delay = max(delay, hint)
+    return delay
@@ -0,0 +1,122 @@
+#
+# ファイル名: m03_transcript_cache.py
+# 役割: Gemini の応答を、入力（音声の内容・プロンプト）・モデル名・生成設定をキーにしてディスクに保存し、再利用する
+#
+# 後続の処理で失敗して再実行した場合や、編集・マガジン化のプロンプトだけを変えて試す場合に、
+# 入力が同じ段階では Gemini を呼ばずに前回の応答を使う。
+# 保存先の合計サイズが TRANSCRIPT_CACHE_MAX_BYTES を超えたら、最後に使ってから時間が経ったものから削除する。
+#
+
+import os
+import json
+import hashlib
+
+PYTHON_NAME = os.path.basename(__file__)
+
+# False のとき、キャッシュを読み書きしない
+TRANSCRIPT_CACHE = True
+# 保存先
+TRANSCRIPT_CACHE_DIR = '.transcript_cache'
+# 保存先の合計サイズの上限（バイト）
+TRANSCRIPT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+
+def file_sha256(path):
+    """音声ファイルの内容の sha256 を返す"""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _config_text(config):
+    """生成設定（types.GenerateContentConfig）を、キーに使える文字列にする"""
+    if hasattr(config, 'model_dump_json'):
+        return config.model_dump_json(exclude_none=True)
+    return json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def make_key(stage, inputs, model_name, config):
+    """
+    キャッシュのキーを返す。
+
+    Args:
+        stage (str): 処理の段階（"transcribe" / "edit" / "magazine" など）。
+        inputs (list): 応答を決める入力（音声ファイルの sha256、プロンプトの全文など）。
+        model_name (str): Gemini のモデル名。
+        config: 生成設定。
+    """
+    sha256 = hashlib.sha256()
+    for part in [stage, *inputs, model_name, _config_text(config)]:
+        data = part.encode('utf-8')
+        # 区切り位置の違う入力が同じキーにならないよう、長さも含める
+        sha256.update(len(data).to_bytes(8, 'big'))
+        sha256.update(data)
+    return sha256.hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(TRANSCRIPT_CACHE_DIR, f"{key}.txt")
+
+
+def get(key):
+    """キーに対応する応答を返す。無い場合は None を返す"""
+    if not TRANSCRIPT_CACHE:
+        return None
+    path = _cache_path(key)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except IOError:
+        return None
+    # 最後に使った時刻として更新時刻を記録し、削除する順番に使う
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return text
+
+
+def put(key, text):
+    """応答を保存し、合計サイズが上限を超えていれば古いものを削除する"""
+    if not TRANSCRIPT_CACHE or not text:
+        return
+    try:
+        os.makedirs(TRANSCRIPT_CACHE_DIR, exist_ok=True)
+        path = _cache_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        # 書き込み途中のファイルを読まないよう、書き終えてから置き換える
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"応答のキャッシュを保存できませんでした: {e} : ({PYTHON_NAME})")
+        return
+    evict()
+
+
+def evict(max_bytes=None):
+    """合計サイズが max_bytes 以下になるまで、最後に使ってから時間が経ったものから削除する。削除した件数を返す"""
+    max_bytes = TRANSCRIPT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    try:
+        with os.scandir(TRANSCRIPT_CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith('.txt'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return 0
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,88 @@
+#
+# ファイル名: m04_result_store.py
+# 役割: 動画の内容（md5）ごとに文字起こし結果を保存し、同じ動画が再アップロードされた場合に再利用する
+#
+
+import os
+import json
+import shutil
+import hashlib
+from datetime import datetime, timezone
+
+PYTHON_NAME = os.path.basename(__file__)
+
+# 結果の保存先。動画の md5 ごとにサブディレクトリを作る
+RESULTS_DIR = '.results_store'
+# 保存対象の出力ファイル（split_m4a 内のファイル名）
+RESULT_FILES = ('z1_combined.txt', 'z2_combined.txt', 'z3_combined.md')
+MANIFEST_FILE = 'manifest.json'
+
+
+def file_md5(path):
+    """ローカルファイルの md5 を計算する（Drive の md5Checksum と照合する場合や、md5Checksum が取得できない場合に使う）"""
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def _result_dir(content_md5):
+    return os.path.join(RESULTS_DIR, content_md5.lower())
+
+
+def lookup(content_md5):
+    """同じ内容の動画の結果が保存されていれば、その情報（manifest）を返す。無ければ None を返す"""
+    if not content_md5:
+        return None
+    manifest_path = os.path.join(_result_dir(content_md5), MANIFEST_FILE)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def save(content_md5, output_dir, file_id, file_name):
+    """output_dir にある出力ファイルを、動画の md5 をキーにして保存する。出力が揃っていない場合は保存しない"""
+    files = list(RESULT_FILES)
+    if not content_md5:
+        return False
+    missing = [name for name in files if not os.path.exists(os.path.join(output_dir, name))]
+    if missing:
+        print(f"出力ファイルが揃っていないため、処理結果は保存しません: {', '.join(missing)} : ({PYTHON_NAME})")
+        return False
+    result_dir = _result_dir(content_md5)
+    tmp_dir = f"{result_dir}.tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    for name in files:
+        shutil.copy2(os.path.join(output_dir, name), tmp_dir)
+    manifest = {
+        'md5': content_md5.lower(),
+        'file_id': file_id,
+        'file_name': file_name,
+        'files': files,
+        'saved_at': datetime.now(timezone.utc).isoformat(),
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    # 途中まで書き込まれた結果を参照しないよう、揃ってから置き換える
+    if os.path.exists(result_dir):
+        shutil.rmtree(result_dir)
+    os.replace(tmp_dir, result_dir)
+    print(f"処理結果を保存しました: {result_dir} : ({PYTHON_NAME})")
+    return True
+
+
+def restore(content_md5, output_dir):
+    """保存済みの結果を output_dir にコピーする。結果が無い場合は False を返す"""
+    manifest = lookup(content_md5)
+    if not manifest:
+        return False
+    os.makedirs(output_dir, exist_ok=True)
+    for name in manifest['files']:
+        shutil.copy2(os.path.join(_result_dir(content_md5), name), output_dir)
+    print(f"'{manifest['file_name']}' の処理結果を再利用しました: {', '.join(manifest['files'])} : ({PYTHON_NAME})")
+    return True
@@ -5,7 +5,7 @@ import shutil
 def main():
     """処理に必要なディレクトリをクリーンアップして再作成する"""
     # 一時ログ用のディレクトリも作成
-    dirs_to_create = ["m4a", "split_m4a", "downloads", "temp_logs","__pycache__"]
+    dirs_to_create = ["m4a", "split_m4a", "downloads", "temp_logs","__pycache__",".partial_downloads",".results_store",".transcript_cache","jobs"]
     for d in dirs_to_create:
         if os.path.exists(d):
             shutil.rmtree(d)
@@ -13,7 +13,7 @@ def main():
         #os.makedirs(d)
         #print(f"ディレクトリ '{d}' を作成しました。")
     
-    delete_files= ["processed_success.log","processed_failure.log","token.json",".env"]
+    delete_files= ["processed_success.log","processed_failure.log",".processed_items.sqlite3",".drive_v3_discovery.json","token.json",".env"]
     for d in delete_files:
         if os.path.exists(d):
             os.remove(d)
@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import httplib2
+import m01_google_drive_manager
+
+PYTHON_NAME = os.path.basename(__file__)
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """
+    Google Drive の get_media の代わりに、Range ヘッダに対応してファイルを返すハンドラ。
+    実際の Drive と同様に、1接続あたりの帯域を throttle_bytes_per_sec に制限する。
+    """
+    protocol_version = 'HTTP/1.1'
+    data = b''
+    throttle_bytes_per_sec = 0
+    latency = 0.0
+
+    def do_GET(self):
+        size = len(self.data)
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get('Range')
+        if range_header and range_header.startswith('bytes='):
+            first, _, last = range_header[len('bytes='):].partition('-')
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+
+        time.sleep(self.latency)
+        self.send_response(status)
+        self.send_header('Content-Length', str(end - start + 1))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+
+        block = 256 * 1024
+        for pos in range(start, end + 1, block):
+            chunk = self.data[pos:min(pos + block, end + 1)]
+            self.wfile.write(chunk)
+            if self.throttle_bytes_per_sec:
+                time.sleep(len(chunk) / self.throttle_bytes_per_sec)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StandInRequest:
+    """get_media が返す HttpRequest のうち、download_video が使う uri と http だけを持つ"""
+    def __init__(self, uri):
+        self.uri = uri
+        self.http = httplib2.Http()
+
+
+class _StandInService:
+    """download_video が呼び出す files().get() / files().get_media() だけを持つ Drive サービスの代わり"""
+    def __init__(self, uri, size, md5_checksum):
+        self.uri = uri
+        self.metadata = {'size': str(size), 'md5Checksum': md5_checksum}
+
+    def files(self):
+        return self
+
+    def get(self, **kwargs):
+        metadata = self.metadata
+        class _Request:
+            def execute(self):
+                return metadata
+        return _Request()
+
+    def get_media(self, **kwargs):
+        return _StandInRequest(self.uri)
+
+
+def run(service, connections, work_dir):
+    """DOWNLOAD_CONNECTIONS を connections にして1回ダウンロードし、所要時間を返す"""
+    m01_google_drive_manager.DOWNLOAD_CONNECTIONS = connections
+    m01_google_drive_manager.DOWNLOADS_DIR = os.path.join(work_dir, f"downloads_{connections}")
+    m01_google_drive_manager.PARTIAL_DOWNLOADS_DIR = os.path.join(work_dir, f"partial_{connections}")
+    started = time.time()
+    ok = m01_google_drive_manager.download_video(service, 'benchmark', 'benchmark.mp4')
+    elapsed = time.time() - started
+    if not ok:
+        print(f"エラー: {connections}接続でのダウンロードに失敗しました。 : ({PYTHON_NAME})")
+        sys.exit(1)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ローカルのHTTPサーバーを相手に、逐次ダウンロードと並列ダウンロードの速度を比較する")
+    parser.add_argument("--size-mb", type=int, default=256, help="テスト用ファイルのサイズ（MB）")
+    parser.add_argument("--connections", type=int, default=4, help="並列ダウンロードの接続数")
+    parser.add_argument("--throttle-mbps", type=float, default=20, help="1接続あたりの帯域（MB/s、0で無制限）")
+    parser.add_argument("--latency", type=float, default=0.05, help="1リクエストあたりの応答遅延（秒）")
+    parser.add_argument("--chunk-mb", type=int, default=16, help="1回の Range リクエストで取得するサイズ（MB）")
+    args = parser.parse_args()
+
+    data = os.urandom(args.size_mb * 1024 * 1024)
+    _RangeHandler.data = data
+    _RangeHandler.throttle_bytes_per_sec = args.throttle_mbps * 1024 * 1024
+    _RangeHandler.latency = args.latency
+    m01_google_drive_manager.DOWNLOAD_CHUNK_SIZE = args.chunk_mb * 1024 * 1024
+    m01_google_drive_manager.PARALLEL_DOWNLOAD_MIN_SIZE = 0
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    uri = f"http://127.0.0.1:{server.server_address[1]}/benchmark.mp4"
+    service = _StandInService(uri, len(data), hashlib.md5(data).hexdigest())
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            sequential = run(service, 1, work_dir)
+            parallel = run(service, args.connections, work_dir)
+    finally:
+        server.shutdown()
+
+    print(f"\n--- ベンチマーク結果（{args.size_mb}MB、1接続あたり {args.throttle_mbps}MB/s） ---")
+    print(f"逐次ダウンロード（1接続）  : {sequential:.2f}秒（{args.size_mb / sequential:.1f} MB/s）")
+    print(f"並列ダウンロード（{args.connections}接続）: {parallel:.2f}秒（{args.size_mb / parallel:.1f} MB/s）")
+    print(f"高速化: {sequential / parallel:.2f}倍")
+
+
+if __name__ == "__main__":
+    main()
+    print(f"Exit : ({PYTHON_NAME})")
@@ -0,0 +1,123 @@
+import os
+import re
+import sys
+import time
+import asyncio
+import difflib
+import argparse
+import tempfile
+import subprocess
+import contextlib
+
+import m02_ffmpeg
+
+PYTHON_NAME = os.path.basename(__file__)
+
+# Gemini は音声1秒あたり32トークンとして入力トークンを数える
+GEMINI_TOKENS_PER_AUDIO_SECOND = 32
+
+
+def make_clip(input_file, seconds, work_dir):
+    """入力の先頭 seconds 秒を再エンコードせずに切り出す（0の場合は入力をそのまま使う）"""
+    if not seconds:
+        return input_file
+    clip_file = os.path.join(work_dir, f"clip{os.path.splitext(input_file)[1]}")
+    subprocess.run(
+        ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-t", str(seconds), "-i", input_file, "-c", "copy", clip_file],
+        check=True,
+    )
+    return clip_file
+
+
+def encode(clip_file, profile, segment_time, work_dir):
+    """プロファイルで変換・分割し、(分割ファイルのリスト, 変換時間) を返す"""
+    m02_ffmpeg.set_audio_profile(profile)
+    output_dir = os.path.join(work_dir, profile)
+    os.makedirs(output_dir)
+    started = time.time()
+    # m02_ffmpeg の完了メッセージで結果が読みにくくならないよう、標準出力は捨てる
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = m02_ffmpeg.convert_and_split(clip_file, output_dir, segment_time, "bench")
+    elapsed = time.time() - started
+    if result != 0:
+        print(f"エラー: プロファイル {profile} での変換に失敗しました。 : ({PYTHON_NAME})")
+        sys.exit(1)
+    segment_files = sorted(
+        os.path.join(output_dir, name) for name in os.listdir(output_dir) if name.startswith("bench_split")
+    )
+    return segment_files, elapsed
+
+
+async def transcribe(segment_files):
+    """m03_gemini_transcript1 と同じ方法で分割ファイルを順に文字起こしし、結合したテキストを返す"""
+    # Gemini を使う場合だけ読み込む（.env の API キーが必要）
+    import m03_gemini_client
+    import m03_gemini_transcript1
+    from m03_api_key_manager import api_key_manager
+
+    texts = []
+    try:
+        for segment_file in segment_files:
+            api_key = await api_key_manager.get_next_key()
+            transcriptions = await m03_gemini_transcript1.gemini_transcribe(api_key, segment_file)
+            if not transcriptions:
+                print(f"エラー: {segment_file} の文字起こしに失敗しました。 : ({PYTHON_NAME})")
+                return None
+            texts.append(transcriptions[0])
+    finally:
+        await m03_gemini_client.close_clients()
+    return "".join(texts)
+
+
+def similarity(reference, text):
+    """空白を除いた文字単位で、2つの文字起こしの一致率（0〜1）を返す"""
+    reference = re.sub(r"\s+", "", reference)
+    text = re.sub(r"\s+", "", text)
+    return difflib.SequenceMatcher(None, reference, text, autojunk=False).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="音声プロファイルごとに、アップロードサイズ・音声の長さ・変換時間・文字起こしの一致率を比較する")
+    parser.add_argument("input_file", help="比較に使う動画または音声ファイル")
+    parser.add_argument("--seconds", type=int, default=600, help="入力の先頭から使う秒数（0で全体）")
+    parser.add_argument("--segment-time", type=int, default=240, help="分割する時間（秒）")
+    parser.add_argument("--profiles", nargs="+", choices=list(m02_ffmpeg.AUDIO_PROFILES),
+                        default=list(m02_ffmpeg.AUDIO_PROFILES), help="比較するプロファイル")
+    parser.add_argument("--transcribe", action="store_true", help="Gemini で文字起こしし、基準との一致率を計算する")
+    parser.add_argument("--reference", help="基準の文字起こし（テキストファイル）。省略時は最初のプロファイルの文字起こしを基準にする")
+    args = parser.parse_args()
+
+    reference = None
+    if args.reference:
+        with open(args.reference, 'r', encoding='utf-8') as f:
+            reference = f.read()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        clip_file = make_clip(args.input_file, args.seconds, work_dir)
+        for profile in args.profiles:
+            print(f"{profile} を変換しています... : ({PYTHON_NAME})")
+            segment_files, encode_time = encode(clip_file, profile, args.segment_time, work_dir)
+            size = sum(os.path.getsize(path) for path in segment_files)
+            audio_seconds = sum(m02_ffmpeg.probe_duration(path) or 0 for path in segment_files)
+            score = None
+            if args.transcribe:
+                text = asyncio.run(transcribe(segment_files))
+                if text is not None:
+                    if reference is None:
+                        reference = text
+                    score = similarity(reference, text)
+            rows.append((profile, size, audio_seconds, encode_time, score))
+
+    span = f"先頭{args.seconds}秒" if args.seconds else "全体"
+    print(f"\n--- ベンチマーク結果（{os.path.basename(args.input_file)}、{span}） ---")
+    print(f"{'プロファイル':<22}{'サイズ(KB)':>12}{'音声(秒)':>10}{'推定トークン':>12}{'変換(秒)':>10}{'一致率':>8}")
+    for profile, size, audio_seconds, encode_time, score in rows:
+        tokens = int(audio_seconds * GEMINI_TOKENS_PER_AUDIO_SECOND)
+        score_text = f"{score:.3f}" if score is not None else "-"
+        print(f"{profile:<22}{size / 1024:>12.0f}{audio_seconds:>10.1f}{tokens:>12}{encode_time:>10.2f}{score_text:>8}")
+
+
+if __name__ == "__main__":
+    main()
+    print(f"Exit : ({PYTHON_NAME})")
@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+PYTHON_NAME = os.path.basename(__file__)
+
+
+async def measure(segment_file, inline):
+    """
+    1つの分割ファイルを m03_gemini_transcript1 と同じ方法で文字起こしし、(準備の秒数, 文字起こしの秒数) を返す。
+    inline が True の場合は音声をリクエストに埋め込み、False の場合は Files API でアップロードする
+    （文字起こしの秒数には、アップロードしたファイルの削除を含む）。失敗した場合は None を返す。
+    """
+    import m03_gemini_transcript1
+    from m03_api_key_manager import api_key_manager
+
+    m03_gemini_transcript1.INLINE_AUDIO_MAX_BYTES = sys.maxsize if inline else 0
+    api_key = await api_key_manager.get_next_key()
+    started = time.time()
+    audio_file = await m03_gemini_transcript1.upload_audio(api_key, segment_file)
+    if audio_file is None:
+        return None
+    prepared = time.time()
+    transcriptions = await m03_gemini_transcript1.generate_transcript(api_key, segment_file, audio_file)
+    if not transcriptions:
+        return None
+    return prepared - started, time.time() - prepared
+
+
+async def run(segment_files, repeat):
+    """分割ファイルごとに、アップロードと埋め込みを交互に repeat 回ずつ計測する"""
+    import m03_gemini_client
+
+    rows = []
+    try:
+        for segment_file in segment_files:
+            for _ in range(repeat):
+                for inline in (False, True):
+                    result = await measure(segment_file, inline)
+                    if result is None:
+                        print(f"エラー: {segment_file} の文字起こしに失敗しました。 : ({PYTHON_NAME})")
+                        continue
+                    rows.append((segment_file, inline) + result)
+    finally:
+        await m03_gemini_client.close_clients()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="分割ファイルごとに、Files API でアップロードする場合とリクエストに埋め込む場合の文字起こしの所要時間を比較する"
+    )
+    parser.add_argument("segment_files", nargs="+", help="比較に使う分割ファイル（split_m4a 内の .m4a / .ogg）")
+    parser.add_argument("--repeat", type=int, default=1, help="分割ファイルごとに、それぞれの方法で計測する回数")
+    args = parser.parse_args()
+
+    # Gemini を使う場合だけ読み込む（.env の API キーが必要）
+    import m03_transcript_cache
+    # キャッシュした文字起こし結果を使うと計測にならないため、キャッシュを読み書きしない
+    m03_transcript_cache.TRANSCRIPT_CACHE = False
+
+    rows = asyncio.run(run(args.segment_files, args.repeat))
+
+    print(f"\n--- ベンチマーク結果（{len(args.segment_files)}ファイル、{args.repeat}回ずつ） ---")
+    print(f"{'ファイル':<28}{'サイズ(KB)':>12}{'方法':>8}{'準備(秒)':>10}{'文字起こし(秒)':>16}{'合計(秒)':>10}")
+    totals = {False: [], True: []}
+    for segment_file, inline, prepare_time, generate_time in rows:
+        method = "埋め込み" if inline else "アップロード"
+        size = os.path.getsize(segment_file)
+        totals[inline].append(prepare_time + generate_time)
+        print(f"{os.path.basename(segment_file):<28}{size / 1024:>12.0f}{method:>8}"
+              f"{prepare_time:>10.2f}{generate_time:>16.2f}{prepare_time + generate_time:>10.2f}")
+    for inline, values in totals.items():
+        if values:
+            method = "埋め込み" if inline else "アップロード"
+            print(f"{method}: 平均 {sum(values) / len(values):.2f}秒 / 分割ファイル（{len(values)}件）")
+
+
+if __name__ == "__main__":
+    main()
+    print(f"Exit : ({PYTHON_NAME})")
@@ -0,0 +1,211 @@
+import os
+import sys
+import argparse
+import tempfile
+
+import httplib2
+from googleapiclient.errors import HttpError
+import m01_google_drive_manager
+from m01_processed_store import ProcessedStore
+
+PYTHON_NAME = os.path.basename(__file__)
+
+# 監視対象フォルダの代わりに使うフォルダID
+FOLDER_ID = 'fake-folder'
+
+
+class _Request:
+    """Drive API のリクエストの代わり。execute() で結果を返す（例外の場合は送出する）"""
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class _FakeDrive:
+    """
+    list_new_videos が呼び出す files().list() / changes().getStartPageToken() / changes().list() だけを持つ Drive サービスの代わり。
+    ファイルを変更するたびに変更履歴に追加し、page token は変更履歴の位置（文字列）で表す。
+    expire_tokens() を呼ぶと、それまでに発行した page token を無効（changes().list() が status の HttpError）にする。
+    """
+    def __init__(self, page_size):
+        self.page_size = page_size
+        self.files_by_id = {}
+        self.changes_log = []  # (fileId, removed)
+        self.valid_from = 0
+        self.expired_status = None
+        self.calls = {'files.list': 0, 'changes.list': 0}
+
+    def put(self, file_id, name, mime_type, created_time, parents=(FOLDER_ID,), trashed=False):
+        """ファイルを追加・更新する"""
+        self.files_by_id[file_id] = {
+            'id': file_id, 'name': name, 'fileExtension': name.rpartition('.')[2], 'size': '1024',
+            'md5Checksum': f"md5-{file_id}", 'createdTime': created_time,
+            'mimeType': mime_type, 'parents': list(parents), 'trashed': trashed,
+        }
+        self.changes_log.append((file_id, False))
+
+    def update(self, file_id, **fields):
+        self.files_by_id[file_id].update(fields)
+        self.changes_log.append((file_id, False))
+
+    def delete(self, file_id):
+        """ゴミ箱を経由せずに完全に削除する（変更は removed になり、file を含まない）"""
+        del self.files_by_id[file_id]
+        self.changes_log.append((file_id, True))
+
+    def expire_tokens(self, status):
+        self.valid_from = len(self.changes_log)
+        self.expired_status = status
+
+    def files(self):
+        drive = self
+
+        class _Files:
+            def list(self, pageToken=None, **kwargs):
+                drive.calls['files.list'] += 1
+                videos = sorted(
+                    (f for f in drive.files_by_id.values()
+                     if FOLDER_ID in f['parents'] and not f['trashed']
+                     and f['mimeType'].startswith(m01_google_drive_manager.MEDIA_MIME_PREFIXES)),
+                    key=lambda f: f['createdTime'],
+                )
+                start = int(pageToken or 0)
+                response = {'files': videos[start:start + drive.page_size]}
+                if start + drive.page_size < len(videos):
+                    response['nextPageToken'] = str(start + drive.page_size)
+                return _Request(response)
+        return _Files()
+
+    def changes(self):
+        drive = self
+
+        class _Changes:
+            def getStartPageToken(self, **kwargs):
+                return _Request({'startPageToken': str(len(drive.changes_log))})
+
+            def list(self, pageToken, **kwargs):
+                drive.calls['changes.list'] += 1
+                start = int(pageToken)
+                if start < drive.valid_from:
+                    resp = httplib2.Response({'status': drive.expired_status})
+                    resp.reason = 'Invalid page token'
+                    return _Request(HttpError(resp, b'{"error": {"message": "Invalid page token"}}'))
+                end = min(start + drive.page_size, len(drive.changes_log))
+                changes = []
+                for file_id, removed in drive.changes_log[start:end]:
+                    change = {'changeType': 'file', 'fileId': file_id, 'removed': removed}
+                    if not removed and file_id in drive.files_by_id:
+                        change['file'] = dict(drive.files_by_id[file_id])
+                    changes.append(change)
+                response = {'changes': changes}
+                if end < len(drive.changes_log):
+                    response['nextPageToken'] = str(end)
+                else:
+                    response['newStartPageToken'] = str(end)
+                return _Request(response)
+        return _Changes()
+
+
+def scan(drive, store):
+    """list_new_videos を1回実行し、(未処理のファイルIDのリスト, files().list の呼び出し回数, changes().list の呼び出し回数) を返す"""
+    before = dict(drive.calls)
+    videos = m01_google_drive_manager.list_new_videos(drive)
+    return ([video['id'] for video in videos],
+            drive.calls['files.list'] - before['files.list'],
+            drive.calls['changes.list'] - before['changes.list'])
+
+
+def check(results, label, actual, expected):
+    ok = actual == expected
+    results.append(ok)
+    print(f"{'OK' if ok else 'NG'}: {label}（期待値 {expected} / 実際 {actual}） : ({PYTHON_NAME})")
+
+
+def run(work_dir, page_size, expired_status):
+    """フルスキャン → 差分の取得 → page token の失効によるフルスキャンを順に確認し、全て期待どおりなら True を返す"""
+    success_log = os.path.join(work_dir, 'processed_success.log')
+    store = ProcessedStore('transcript', [success_log], db_path=os.path.join(work_dir, 'processed.sqlite3'))
+    m01_google_drive_manager._processed_store = store
+    m01_google_drive_manager.SHARED_DRIVE_FOLDER_ID = FOLDER_ID
+    m01_google_drive_manager.INCREMENTAL_SCAN = True
+
+    drive = _FakeDrive(page_size)
+    drive.put('a', 'a.mp4', 'video/mp4', '2024-01-01T00:00:00Z')
+    drive.put('b', 'b.m4a', 'audio/mp4', '2024-01-02T00:00:00Z')
+    drive.put('c', 'c.jpg', 'image/jpeg', '2024-01-03T00:00:00Z')
+    drive.put('d', 'd.mp4', 'video/mp4', '2024-01-04T00:00:00Z', parents=('other-folder',))
+    drive.put('e', 'e.mp4', 'video/mp4', '2024-01-05T00:00:00Z', trashed=True)
+    results = []
+
+    print(f"\n--- 1回目: page token が無いため、フォルダ全体をスキャンする : ({PYTHON_NAME})")
+    ids, files_calls, changes_calls = scan(drive, store)
+    check(results, "未処理の動画", ids, ['a', 'b'])
+    check(results, "files().list を使う", files_calls > 0, True)
+    check(results, "changes().list を使わない", changes_calls, 0)
+    check(results, "page token を保存する", store.get_meta('changes_page_token'), str(len(drive.changes_log)))
+
+    print(f"\n--- 2回目: 前回以降の変更だけを反映する : ({PYTHON_NAME})")
+    store.record(success_log, 'b', 'b.m4a', 'success')
+    drive.put('f', 'f.mov', 'video/quicktime', '2024-01-06T00:00:00Z')
+    drive.update('a', trashed=True)
+    drive.update('d', parents=[FOLDER_ID])
+    drive.put('g', 'g.mp4', 'video/mp4', '2024-01-07T00:00:00Z')
+    drive.delete('g')
+    drive.update('f', name='f_renamed.mov')
+    ids, files_calls, changes_calls = scan(drive, store)
+    check(results, "未処理の動画", ids, ['d', 'f'])
+    check(results, "files().list を使わない", files_calls, 0)
+    check(results, "changes().list を使う", changes_calls > 0, True)
+    check(results, "変更後のファイル名", [v['name'] for v in store.unprocessed_folder_files()], ['d.mp4', 'f_renamed.mov'])
+    check(results, "page token を進める", store.get_meta('changes_page_token'), str(len(drive.changes_log)))
+
+    print(f"\n--- 3回目: 変更が無い : ({PYTHON_NAME})")
+    ids, files_calls, _ = scan(drive, store)
+    check(results, "未処理の動画", ids, ['d', 'f'])
+    check(results, "files().list を使わない", files_calls, 0)
+
+    print(f"\n--- 4回目: page token が無効（HTTP {expired_status}）になったため、フォルダ全体をスキャンし直す : ({PYTHON_NAME})")
+    drive.put('h', 'h.mp4', 'video/mp4', '2024-01-08T00:00:00Z')
+    drive.expire_tokens(expired_status)
+    ids, files_calls, changes_calls = scan(drive, store)
+    check(results, "未処理の動画", ids, ['d', 'f', 'h'])
+    check(results, "files().list を使う", files_calls > 0, True)
+    check(results, "新しい page token を保存する", store.get_meta('changes_page_token'), str(len(drive.changes_log)))
+
+    print(f"\n--- 5回目: 取り直した page token で差分の取得に戻る : ({PYTHON_NAME})")
+    drive.delete('d')
+    ids, files_calls, _ = scan(drive, store)
+    check(results, "未処理の動画", ids, ['f', 'h'])
+    check(results, "files().list を使わない", files_calls, 0)
+
+    store.close()
+    m01_google_drive_manager._processed_store = None
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drive の代わりのローカルの一覧を相手に、list_new_videos のフルスキャン・差分の取得・page token 失効時のフルスキャンを確認する"
+    )
+    parser.add_argument("--page-size", type=int, default=2, help="files().list / changes().list の1ページあたりの件数")
+    args = parser.parse_args()
+
+    failed = []
+    for expired_status in (404, 410):
+        with tempfile.TemporaryDirectory() as work_dir:
+            if not run(work_dir, args.page_size, expired_status):
+                failed.append(expired_status)
+
+    if failed:
+        print(f"\nエラー: 期待どおりでない確認がありました（page token 失効時の HTTP {failed}）。 : ({PYTHON_NAME})")
+        sys.exit(1)
+    print(f"\n全ての確認が期待どおりでした。 : ({PYTHON_NAME})")
+
+
+if __name__ == "__main__":
+    main()
+    print(f"Exit : ({PYTHON_NAME})")